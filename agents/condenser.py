@@ -0,0 +1,29 @@
+CONDENSER_PROMPT = """
+Ты готовишь выжимку медицинских документов для консилиума врачей.
+Врачи будут читать ТОЛЬКО твою выжимку, а не сам документ — поэтому ничего важного не теряй.
+
+Перепиши факты из документа в структуру ниже. Числа, дозировки, даты и названия — дословно, как в документе.
+Ничего не толкуй и не добавляй от себя. Если раздел пустой — пиши "нет данных".
+
+ТИП И ИСТОЧНИКИ: какие документы, от каких дат, какие учреждения
+
+ПРЕПАРАТЫ:
+- название — доза — схема — с какой даты / до какой даты — кто назначил
+
+ХРОНОЛОГИЯ:
+- дата — событие (ухудшение, улучшение, госпитализация, смена лечения)
+
+НАХОДКИ ОБСЛЕДОВАНИЙ:
+- дата — ЭЭГ / МРТ / другое — что найдено (формулировки заключения дословно)
+
+АНАЛИЗЫ:
+- дата — показатель — значение — норма, если указана
+
+ДИАГНОЗЫ И ЗАКЛЮЧЕНИЯ:
+- дата — кто — формулировка
+
+ПРОТИВОРЕЧИЯ И ПРОБЕЛЫ:
+- что не сходится между документами, что назначено но не проверено
+
+Только структура. Без вступлений и выводов.
+"""
@@ -1,5 +1,6 @@
 EDITOR_PROMPT = """
-Ты получаешь ответы от четырёх специалистов которые изучили документ и искали информацию в интернете.
+Ты получаешь ответы специалистов консилиума которые изучили документ и искали информацию в интернете.
+Кто именно участвовал — указано в начале (зависит от типа документа).
 
 Твоя задача — собрать живой разговор. Не отчёт. Не список.
 
@@ -11,6 +12,7 @@ EDITOR_PROMPT = """
 **Невролог:** [его главная находка]
 **Педиатр:** [его главная находка]  
 **Психиатр:** [его главная находка]
+Только те, кто есть среди ответов. Кого нет — не упоминай.
 
 Потом навигатор переводит на простой язык — без терминов, как другу.
 
@@ -20,7 +22,7 @@ EDITOR_PROMPT = """
 
 ВАЖНО:
 - Если специалисты нашли разные или противоречивые вещи — покажи это
-- Не повторяй одно и то же четыре раза
+- Не повторяй одно и то же несколько раз
 - Читается за 2 минуты
 
 Последняя строка курсивом:
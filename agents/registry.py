@@ -0,0 +1,97 @@
+"""
+Yasno council agents, declared in one place.
+
+Each entry says what the agent runs on (prompt, model, max_tokens) and
+where it sits in the pipeline:
+
+- role: "router" and "condenser" prepare the document, "specialist" agents
+  form the council, the "editor" turns their answers into the final reply.
+  The router, condenser and editor have fixed stages and call no tools;
+  the fields below are for specialists only.
+- tools: tools the specialist may use (see TOOLS)
+- deps: specialists whose answers this specialist reads before answering;
+  the council starts an agent as soon as its deps have finished
+- doc_types: document types the specialist is called for (None: always).
+  Unknown types, HISTORY, CONSULTATION and MIXED get every specialist.
+
+A new specialist (a pharmacologist, a data analyst) is one more entry here.
+Without deps it runs alongside the others and does not lengthen the council.
+"""
+
+from agents.router import ROUTER_PROMPT
+from agents.condenser import CONDENSER_PROMPT
+from agents.neurologist import NEUROLOGIST_PROMPT
+from agents.pediatrician import PEDIATRICIAN_PROMPT
+from agents.psychiatrist import PSYCHIATRIST_PROMPT
+from agents.navigator import NAVIGATOR_PROMPT
+from agents.editor import EDITOR_PROMPT
+
+MODEL = "gpt-4o"
+
+# Инструменты, которые агент может запросить, по имени
+TOOLS = {
+    "web_search": {"type": "web_search_preview"},
+}
+
+REGISTRY = {
+    "Роутер": {
+        "role": "router", "prompt": ROUTER_PROMPT, "model": MODEL, "max_tokens": 10,
+    },
+    "Выжимка": {
+        "role": "condenser", "prompt": CONDENSER_PROMPT, "model": MODEL, "max_tokens": 1500,
+    },
+    "Невролог": {
+        "role": "specialist", "prompt": NEUROLOGIST_PROMPT, "model": MODEL, "max_tokens": 800,
+        "tools": ["web_search"], "deps": [], "doc_types": ["EEG", "MRI", "PRESCRIPTION", "PROTOCOL"],
+    },
+    "Педиатр": {
+        "role": "specialist", "prompt": PEDIATRICIAN_PROMPT, "model": MODEL, "max_tokens": 800,
+        "tools": ["web_search"], "deps": [], "doc_types": ["EEG", "MRI", "LAB"],
+    },
+    "Психиатр": {
+        "role": "specialist", "prompt": PSYCHIATRIST_PROMPT, "model": MODEL, "max_tokens": 800,
+        "tools": ["web_search"], "deps": [], "doc_types": ["PRESCRIPTION", "PROTOCOL"],
+    },
+    "Навигатор": {
+        "role": "specialist", "prompt": NAVIGATOR_PROMPT, "model": MODEL, "max_tokens": 800,
+        "tools": ["web_search"], "deps": [], "doc_types": None,
+    },
+    "Редактор": {
+        "role": "editor", "prompt": EDITOR_PROMPT, "model": MODEL, "max_tokens": 800,
+    },
+}
+
+
+def agent(role: str) -> tuple:
+    """(name, spec) of the single agent with this role (router, condenser, editor)."""
+    return next((name, spec) for name, spec in REGISTRY.items() if spec["role"] == role)
+
+
+def specialists() -> dict:
+    return {name: spec for name, spec in REGISTRY.items() if spec["role"] == "specialist"}
+
+
+def check_registry(registry: dict = REGISTRY):
+    """Raise ValueError on unknown tools, deps that are not specialists, or dependency cycles."""
+    for name, spec in registry.items():
+        if spec["role"] != "specialist" and ("tools" in spec or "deps" in spec):
+            raise ValueError(f"{name}: tools и deps бывают только у специалистов")
+        for tool in spec.get("tools", []):
+            if tool not in TOOLS:
+                raise ValueError(f"{name}: неизвестный инструмент {tool}")
+        for dep in spec.get("deps", []):
+            if registry.get(dep, {}).get("role") != "specialist":
+                raise ValueError(f"{name}: зависимость {dep} не специалист")
+
+    done = set()
+    remaining = {name: set(spec.get("deps", [])) for name, spec in registry.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if deps <= done]
+        if not ready:
+            raise ValueError("цикл зависимостей: " + ", ".join(remaining))
+        for name in ready:
+            done.add(name)
+            del remaining[name]
+
+
+check_registry()
@@ -6,13 +6,18 @@ Yasno — Video Analysis
 import sys
 import os
 import base64
-import cv2
 import json
 from openai import OpenAI
+from clients import get_client
+import video_frames
+from rate_limiter import get_limiter, estimate_tokens, PRIORITY_BATCH
 
 # ─── CONFIG ───────────────────────────────────────
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 FRAMES_TO_EXTRACT = 12  # Сколько кадров берём из видео
+FRAME_SAMPLER = "adaptive"  # "uniform" — равномерно, "adaptive" — чаще там, где больше движения
+DEDUP_THRESHOLD = video_frames.DEDUP_THRESHOLD  # None — не убирать почти одинаковые кадры
+FRAME_DETAIL = "low"  # low = дешевле (кадр 512px), high = точнее
 OUTPUT_FILE = "yasno_report.txt"
 
 SYSTEM_PROMPT = """
@@ -58,37 +63,56 @@ RULES:
 """
 
 
-def extract_frames(video_path: str, num_frames: int = 12) -> list:
-    """Извлекает кадры из видео равномерно"""
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Не могу открыть видео: {video_path}")
+def extract_frames(video_path: str, num_frames: int = 12, strategy: str = video_frames.DEFAULT_STRATEGY,
+                   sampler: str = "uniform", dedup_threshold: int = None, workers: int = None,
+                   detail: str = "low") -> list:
+    """
+    Извлекает кадры из видео: равномерно (sampler="uniform") или по активности
+    (sampler="adaptive", см. video_frames.SAMPLERS). strategy — способ декодирования,
+    см. video_frames.STRATEGIES.
 
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    duration = total_frames / fps if fps > 0 else 0
+    С dedup_threshold почти одинаковые кадры (pHash, расстояние Хэмминга не больше
+    порога) объединяются, а освободившиеся места добираются из недовыбранных
+    участков видео. У кадра в "merged" — времена объединённых с ним кадров.
 
-    print(f"Видео: {duration:.1f} сек, {total_frames} кадров, {fps:.1f} fps")
+    Длинные видео читаются сегментами в workers процессах
+    (по умолчанию YASNO_VIDEO_WORKERS или число ядер).
 
-    # Равномерно берём кадры
-    indices = [int(i * total_frames / num_frames) for i in range(num_frames)]
+    Кадры сразу уменьшаются до размера, который модель оставит при detail,
+    и хранятся как JPEG ("jpeg"); base64 строится только при отправке.
+    """
+    cap, info = video_frames.open_video(video_path)
+    cap.release()
+    total_frames = info["total_frames"]
+    fps = info["fps"]
+
+    print(f"Видео: {info['duration']:.1f} сек, {total_frames} кадров, {fps:.1f} fps")
+
+    indices = video_frames.sample_indices(video_path, info, num_frames, sampler, strategy, workers)
+
+    encoder = video_frames.FrameEncoder(detail)
+    decoded = video_frames.iter_frames(video_path, info, indices, strategy, workers)
+    merged = {}
+    if dedup_threshold is not None:
+        encoded, merged = video_frames.dedup_frames(video_path, info, decoded, dedup_threshold, strategy=strategy,
+                                                    workers=workers, encode=encoder.encode)
+        if merged:
+            print(f"Объединено похожих кадров: {sum(len(d) for d in merged.values())}")
+    else:
+        encoded = [(idx, encoder.encode(frame)) for idx, frame in decoded]
 
     frames = []
-    for idx in indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-        ret, frame = cap.read()
-        if ret:
-            # Конвертируем в JPEG base64
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            b64 = base64.b64encode(buffer).decode('utf-8')
-            timestamp = idx / fps if fps > 0 else 0
-            frames.append({
-                "b64": b64,
-                "timestamp": timestamp,
-                "frame_idx": idx
-            })
+    for idx, jpeg in encoded:
+        timestamp = idx / fps if fps > 0 else 0
+        frames.append({
+            "jpeg": jpeg,
+            "detail": detail,
+            "timestamp": timestamp,
+            "frame_idx": idx,
+            "activity": indices.get(idx),
+            "merged": [d / fps if fps > 0 else 0 for d in merged.get(idx, [])]
+        })
 
-    cap.release()
     print(f"Извлечено {len(frames)} кадров")
     return frames
 
@@ -99,33 +123,50 @@ def analyze_frames(client: OpenAI, frames: list) -> dict:
     # Строим сообщение с кадрами
     content = []
 
+    if any(frame.get("activity") is not None for frame in frames):
+        sampling = "Кадры охватывают всё видео, но чаще взяты там, где больше движения или смена сцены — интервалы между ними неравные."
+    else:
+        sampling = "Кадры сделаны равномерно на протяжении всего видео."
+
     content.append({
         "type": "text",
-        "text": f"Я предоставляю {len(frames)} кадров из видео ребёнка. Кадры сделаны равномерно на протяжении всего видео. Проанализируй поведенческие паттерны."
+        "text": f"Я предоставляю {len(frames)} кадров из видео ребёнка. {sampling} Проанализируй поведенческие паттерны."
     })
 
+    def same_as(frame):
+        times = ", ".join(f"{t:.1f}" for t in frame.get("merged", []))
+        return f"; так же выглядит в {times} сек" if times else ""
+
+    # base64 — только здесь, при сборке запроса
     for i, frame in enumerate(frames):
         # Добавляем временную метку
         content.append({
             "type": "text",
-            "text": f"Кадр {i+1} (время: {frame['timestamp']:.1f} сек):"
+            "text": f"Кадр {i+1} (время: {frame['timestamp']:.1f} сек{same_as(frame)}):"
         })
         content.append({
             "type": "image_url",
             "image_url": {
-                "url": f"data:image/jpeg;base64,{frame['b64']}",
-                "detail": "low"  # low = дешевле, high = точнее
+                "url": "data:image/jpeg;base64," + base64.b64encode(frame["jpeg"]).decode("ascii"),
+                "detail": frame["detail"]
             }
         })
 
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+    # Пакетный анализ пропускает вперёд чат и консилиум
+    waited = get_limiter(client.api_key).acquire(estimate_tokens(messages, 2000), PRIORITY_BATCH)
+    if waited >= 1:
+        print(f"Ждали лимита API: {waited:.1f} сек")
+
     print("Отправляю в GPT-4o Vision...")
 
     response = client.chat.completions.create(
         model="gpt-4o",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": content}
-        ],
+        messages=messages,
         max_tokens=2000,
         temperature=0.2
     )
@@ -146,7 +187,7 @@ def analyze_frames(client: OpenAI, frames: list) -> dict:
         return {"raw_response": raw, "error": "Не удалось распарсить JSON"}
 
 
-def format_report(analysis: dict, video_path: str) -> str:
+def format_report(analysis: dict, video_path: str, frames: list = None) -> str:
     """Форматирует красивый текстовый отчёт"""
 
     lines = []
@@ -154,6 +195,12 @@ def format_report(analysis: dict, video_path: str) -> str:
     lines.append("YASNO — ОТЧЁТ ПО ВИДЕОНАБЛЮДЕНИЮ")
     lines.append("=" * 60)
     lines.append(f"Файл: {os.path.basename(video_path)}")
+    merged = [f for f in frames or [] if f.get("merged")]
+    if merged:
+        lines.append("Похожие кадры объединены (вместо них взяты другие моменты видео):")
+        for frame in merged:
+            times = ", ".join(f"{t:.1f}" for t in frame["merged"])
+            lines.append(f"   {frame['timestamp']:.1f} сек ← {times} сек")
     lines.append("")
 
     if "error" in analysis:
@@ -216,14 +263,15 @@ def main():
         print("Нужен API ключ")
         sys.exit(1)
 
-    client = OpenAI(api_key=api_key)
+    client = get_client(api_key)
 
     print(f"\nАнализирую: {video_path}")
     print("-" * 40)
 
     # Шаг 1 — Извлечь кадры
     try:
-        frames = extract_frames(video_path, FRAMES_TO_EXTRACT)
+        frames = extract_frames(video_path, FRAMES_TO_EXTRACT, sampler=FRAME_SAMPLER,
+                                dedup_threshold=DEDUP_THRESHOLD, detail=FRAME_DETAIL)
     except Exception as e:
         print(f"Ошибка при чтении видео: {e}")
         print("Убедитесь что opencv установлен: pip install opencv-python")
@@ -237,7 +285,7 @@ def main():
         sys.exit(1)
 
     # Шаг 3 — Отчёт
-    report = format_report(analysis, video_path)
+    report = format_report(analysis, video_path, frames)
 
     print("\n" + report)
 
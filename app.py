@@ -1,10 +1,17 @@
 import streamlit as st
-from openai import OpenAI
 import base64
-import fitz
 from prompt import SYSTEM_PROMPT, VIDEO_PROMPT, WELCOME_MESSAGE
 from deep_analysis_prompt import DEEP_ANALYSIS_PROMPT
-from council import run_council_sync
+from council import council_events_sync
+from content_cache import get_cache, content_hash
+from clients import get_client
+import pdf_extract
+from image_prep import prepare_image
+from doc_index import get_index, select_chunks
+from message_budget import assemble, attachment, image_tokens, REPLY_TOKENS
+from history_summary import summarize_turns
+from stream_render import StreamRenderer
+from rate_limiter import get_limiter, estimate_tokens, PRIORITY_CHAT
 
 st.set_page_config(page_title="Yasno", page_icon="🌉", layout="wide", initial_sidebar_state="expanded")
 
@@ -35,17 +42,19 @@ if not api_key:
     st.markdown("<div style='text-align:center;padding:60px 20px;'><h1 style='color:#E8E4DC;'>🌉 Yasno</h1><p style='color:#8AADCC;'>Введите API ключ в боковой панели</p></div>", unsafe_allow_html=True)
     st.stop()
 
-client = OpenAI(api_key=api_key)
+client = get_client(api_key)
 
-def extract_pdf_text(file_bytes):
-    try:
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text.strip()
-    except Exception as e:
-        return f"Ошибка чтения PDF: {e}"
+pdf_cache = get_cache("pdf-pages")
+PAGE_IMAGE_BUDGET = 8 * 1024 * 1024  # байт сканов страниц на один запрос
+FULL_TEXT_CHARS = 12000  # документ короче — отправляем целиком и в обычном режиме
+
+def extract_pdf_pages(file_bytes, key=None):
+    key = key or content_hash(file_bytes)
+    pages = pdf_cache.get(key)
+    if pages is None:
+        pages = pdf_extract.extract_pdf_pages(file_bytes)
+        pdf_cache.put(key, pages)
+    return pages
 
 def encode_image(file_bytes):
     return base64.b64encode(file_bytes).decode("utf-8")
@@ -57,37 +66,111 @@ def build_messages(user_text, uploaded_files, history):
     else:
         system = SYSTEM_PROMPT
 
-    messages = [{"role": "system", "content": system}]
-    for msg in history[-6:]:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-
-    content = []
+    attachments = []
+    page_image_bytes = 0
+    stats = {"image_bytes_original": 0, "image_bytes_sent": 0}
+    st.session_state.request_stats = stats
+    # Обычный режим: большие PDF — оглавление + фрагменты по вопросу; глубокий — целиком
+    use_retrieval = mode != "Глубокий анализ"
+    indexes = {}          # позиция в attachments -> индекс; имена файлов могут совпадать
+    retrieval_names = {}
     if uploaded_files:
         for f in uploaded_files:
             file_bytes = f.getvalue()
             if f.type == "application/pdf":
-                pdf_text = extract_pdf_text(file_bytes)
-                content.append({"type": "text", "text": "[Документ: " + f.name + "]\n\n" + pdf_text})
+                doc_hash = content_hash(file_bytes)
+                try:
+                    pages = extract_pdf_pages(file_bytes, doc_hash)
+                    pdf_text = pdf_extract.pages_to_text(pages)
+                except Exception as e:
+                    pages, pdf_text = [], f"Ошибка чтения PDF: {e}"
+                if use_retrieval and len(pdf_text) > FULL_TEXT_CHARS:
+                    slot = len(attachments)
+                    indexes[slot] = get_index(doc_hash, pages)
+                    retrieval_names[slot] = f.name
+                    attachments.append(None)
+                else:
+                    attachments.append(attachment("document", f.name, [{"type": "text", "text": "[Документ: " + f.name + "]\n\n" + pdf_text}]))
+                for p in pages:
+                    if p["image"] is None:
+                        continue
+                    label = f.name + ", стр. " + str(p["page"])
+                    if page_image_bytes + len(p["image"]) > PAGE_IMAGE_BUDGET:
+                        attachments.append(attachment("note", label, [{"type": "text", "text": "[" + label + ": скан не приложен — превышен лимит изображений]"}]))
+                        continue
+                    page_image_bytes += len(p["image"])
+                    b64 = encode_image(p["image"])
+                    attachments.append(attachment("image", label, [
+                        {"type": "text", "text": "[" + label + "]"},
+                        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + b64, "detail": "high"}, "tokens": image_tokens(p["image"], "high")},
+                    ]))
             elif f.type.startswith("image/"):
-                b64 = encode_image(file_bytes)
-                content.append({"type": "image_url", "image_url": {"url": "data:" + f.type + ";base64," + b64, "detail": "high"}})
+                img = prepare_image(file_bytes, mode)
+                stats["image_bytes_original"] += img["original_bytes"]
+                stats["image_bytes_sent"] += img["sent_bytes"]
+                b64 = encode_image(img["data"])
+                attachments.append(attachment("image", f.name, [
+                    {"type": "image_url", "image_url": {"url": "data:" + (img["mime"] or f.type) + ";base64," + b64, "detail": img["detail"]}, "tokens": image_tokens(img["data"], img["detail"])},
+                ]))
             elif f.type == "text/plain":
                 text = file_bytes.decode("utf-8", errors="ignore")
-                content.append({"type": "text", "text": "[Файл: " + f.name + "]\n\n" + text})
+                attachments.append(attachment("document", f.name, [{"type": "text", "text": "[Файл: " + f.name + "]\n\n" + text}]))
             elif f.type.startswith("video/"):
-                content.append({"type": "text", "text": "[Видео: " + f.name + "] Опишите что происходит в видео."})
+                attachments.append(attachment("note", f.name, [{"type": "text", "text": "[Видео: " + f.name + "] Опишите что происходит в видео."}]))
 
-    if user_text:
-        content.append({"type": "text", "text": user_text})
+    if indexes:
+        selected = select_chunks(indexes, user_text or "")
+        for slot, name in retrieval_names.items():
+            text = "[Документ: " + name + " — оглавление и фрагменты по вопросу]\n\n" + indexes[slot].outline
+            for chunk in selected[slot]:
+                text += "\n\n--- стр. " + str(chunk["page"]) + " ---\n" + chunk["text"]
+            attachments[slot] = attachment("document", name, [{"type": "text", "text": text}])
 
-    messages.append({"role": "user", "content": content if len(content) > 1 else user_text})
+    # Не поместившиеся старые реплики сворачиваем в конспект; с ним может выпасть
+    # ещё пара реплик — тогда дописываем конспект (только новые реплики)
+    summaries = st.session_state.setdefault("history_summaries", {})
+    summary = None
+    covered = 0
+    while True:
+        messages, budget_report = assemble(system, history, attachments, user_text, summary)
+        aged = budget_report["history_dropped"]
+        if aged <= covered:
+            break
+        new_summary = summarize_turns(client, history[:aged], summaries)
+        if new_summary is None:
+            break
+        summary, covered = new_summary, aged
+    stats["tokens_used"] = budget_report["used"]
+    stats["dropped"] = budget_report["dropped"]
     return messages
 
+QUEUE_LABELS = {"chat": "чат", "council": "консилиум", "batch": "видео"}
+
+def format_request_stats(stats):
+    parts = []
+    if stats.get("image_bytes_original"):
+        saved = stats["image_bytes_original"] - stats["image_bytes_sent"]
+        parts.append("фото: {:.1f} МБ → {:.1f} МБ (−{:.1f} МБ)".format(
+            stats["image_bytes_original"] / 1e6, stats["image_bytes_sent"] / 1e6, saved / 1e6))
+    for item in stats.get("dropped", []):
+        parts.append(("обрезано по лимиту: " if item["truncated"] else "не поместилось: ") + item["label"])
+    if stats.get("queue_wait", 0) >= 0.5:
+        queue = ", ".join("{} {}".format(QUEUE_LABELS[name], depth)
+                          for name, depth in stats.get("queue_depth", {}).items() if depth)
+        parts.append("ожидание лимита API: {:.1f} с".format(stats["queue_wait"]) + (" (в очереди: " + queue + ")" if queue else ""))
+    if stats.get("ttft") is not None:
+        parts.append("первый токен: {:.1f} с, {:.0f} ток/с".format(stats["ttft"], stats["tokens_per_sec"]))
+    return " · ".join(parts)
+
 def get_response(messages):
+    limiter = get_limiter(api_key)
+    stats = st.session_state.setdefault("request_stats", {})
+    stats["queue_depth"] = limiter.stats()["queue_depth"]  # кто стоял впереди нас
+    stats["queue_wait"] = limiter.acquire(estimate_tokens(messages, REPLY_TOKENS), PRIORITY_CHAT)
     return client.chat.completions.create(
         model="gpt-4o",
         messages=messages,
-        max_tokens=2000,
+        max_tokens=REPLY_TOKENS,
         temperature=0.3,
         stream=True
     )
@@ -120,6 +203,7 @@ with st.sidebar:
         st.session_state.council_question = ""
     if st.button("🗑️ Очистить чат"):
         st.session_state.messages = []
+        st.session_state.history_summaries = {}
         st.session_state.quick_input = ""
         st.session_state.run_council = False
         st.rerun()
@@ -153,35 +237,69 @@ if st.session_state.run_council and uploaded_files:
     st.session_state.messages.append({"role": "user", "content": "Консилиум специалистов"})
 
     with st.chat_message("assistant"):
-        with st.spinner("Консилиум читает документ... 15-20 секунд."):
-            doc_text = ""
-            for f in uploaded_files:
-                file_bytes = f.getvalue()
-                if f.type == "application/pdf":
-                    doc_text += extract_pdf_text(file_bytes)
-                elif f.type == "text/plain":
-                    doc_text += file_bytes.decode("utf-8", errors="ignore")
-
-            # Add last user question if exists
-            last_q = ""
-            for msg in reversed(st.session_state.messages):
-                if msg["role"] == "user" and msg["content"] != "Консилиум специалистов":
-                    last_q = msg["content"]
-                    break
-
-            council_input = doc_text
-            if last_q:
-                council_input = doc_text + "|||" + last_q
-
-            if doc_text.strip():
+        # Страницы разделены \f, документы — заголовком: по этим границам режет map-reduce
+        doc_parts = []
+        for f in uploaded_files:
+            file_bytes = f.getvalue()
+            if f.type == "application/pdf":
                 try:
-                    result = run_council_sync(api_key, council_input)
-                    st.markdown(result)
-                    st.session_state.messages.append({"role": "assistant", "content": result})
+                    text = pdf_extract.pages_to_text(extract_pdf_pages(file_bytes), separator="\f",
+                                                     images_attached=False)
                 except Exception as e:
-                    st.error("Ошибка консилиума: " + str(e))
+                    text = f"Ошибка чтения PDF: {e}"
+            elif f.type == "text/plain":
+                text = file_bytes.decode("utf-8", errors="ignore")
             else:
-                st.warning("Загрузите PDF документ для консилиума.")
+                continue
+            if text.strip():
+                doc_parts.append("[Документ: " + f.name + "]\n" + text)
+        doc_text = "\n\n".join(doc_parts)
+
+        # Add last user question if exists
+        last_q = ""
+        for msg in reversed(st.session_state.messages):
+            if msg["role"] == "user" and msg["content"] != "Консилиум специалистов":
+                last_q = msg["content"]
+                break
+
+        council_input = doc_text
+        if last_q:
+            council_input = doc_text + "|||" + last_q
+
+        if doc_text.strip():
+            status = st.status("Консилиум читает документ...", expanded=True)
+            progress = status.empty()
+            placeholder = st.empty()
+            renderer = StreamRenderer(placeholder)
+            agents = {}
+            icons = {"ok": "✅", "error": "⚠️", "timeout": "⌛"}
+            result = ""
+            try:
+                for event in council_events_sync(api_key, council_input):
+                    kind = event["type"]
+                    if kind == "router_decided":
+                        status.update(label="Консилиум читает документ... Тип: " + event["doc_type"])
+                    elif kind == "agent_started":
+                        agents[event["agent"]] = "⏳ " + event["agent"]
+                    elif kind == "agent_finished":
+                        agents[event["agent"]] = icons[event["status"]] + " " + event["agent"]
+                    elif kind == "editor_started":
+                        status.update(label="Редактор собирает ответ...")
+                    elif kind == "editor_delta":
+                        renderer.write(event["text"])
+                    elif kind == "done":
+                        result = event["text"]
+                    if kind in ("agent_started", "agent_finished"):
+                        progress.markdown("  \n".join(agents.values()))
+                renderer.finish()
+                placeholder.markdown(result)
+                status.update(label="Консилиум завершён", state="complete", expanded=False)
+                st.session_state.messages.append({"role": "assistant", "content": result})
+            except Exception as e:
+                status.update(label="Ошибка консилиума", state="error")
+                st.error("Ошибка консилиума: " + str(e))
+        else:
+            st.warning("Загрузите PDF документ для консилиума.")
 
 elif st.session_state.run_council:
     st.session_state.run_council = False
@@ -202,17 +320,21 @@ if user_text:
 
     with st.chat_message("assistant"):
         placeholder = st.empty()
-        full_response = ""
+        renderer = StreamRenderer(placeholder)
         try:
             messages = build_messages(user_text, uploaded_files, st.session_state.messages[:-1])
+            renderer.start()
             with st.spinner("Читаю..."):
                 stream = get_response(messages)
             for chunk in stream:
-                delta = chunk.choices[0].delta.content
-                if delta:
-                    full_response += delta
-                    placeholder.markdown(full_response + "▌")
-            placeholder.markdown(full_response)
+                if chunk.choices:
+                    renderer.write(chunk.choices[0].delta.content)
+            full_response = renderer.finish()
             st.session_state.messages.append({"role": "assistant", "content": full_response})
+            stats = st.session_state.get("request_stats", {})
+            stats.update(renderer.stats())
+            request_stats = format_request_stats(stats)
+            if request_stats:
+                st.caption(request_stats)
         except Exception as e:
             placeholder.markdown("Ошибка: " + str(e))
@@ -0,0 +1,85 @@
+"""
+Yasno — long-lived event loop for async work from sync code.
+
+asyncio.run() builds and tears down a loop on every call, dropping every
+pooled async connection with it. Instead one daemon thread runs a loop for
+the whole process; Streamlit sessions submit coroutines to it and wait on
+concurrent.futures.Future results, so councils from many sessions run
+concurrently on one shared async client pool.
+"""
+
+import asyncio
+import queue
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            threading.Thread(target=run, name="yasno-async", daemon=True).start()
+            ready.wait()
+            _loop = loop
+        return _loop
+
+
+def submit(coro):
+    """Schedule `coro` on the shared loop; returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro, timeout: float = None):
+    """Block the calling thread until `coro` finishes on the shared loop."""
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+_DONE = object()
+
+
+def iterate_sync(agen):
+    """
+    Iterate an async generator from sync code: items are produced on the
+    shared loop and handed over through a queue as soon as they are ready.
+    Closing the iterator early cancels the producer.
+    """
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_DONE, e))
+            raise
+        else:
+            items.put((_DONE, None))
+        finally:
+            await agen.aclose()
+
+    future = submit(pump())
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None and not isinstance(error, asyncio.CancelledError):
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
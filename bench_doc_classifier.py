@@ -0,0 +1,131 @@
+"""
+Yasno — accuracy/latency harness for doc_classifier
+Запуск: python3 bench_doc_classifier.py
+
+Прогоняет локальный классификатор по размеченным примерам:
+точность, доля уверенных ответов (без LLM), точность среди уверенных, задержка.
+
+FIXTURES написаны по списку признаков и проверяют только, что признаки
+работают. HELD_OUT — формулировки из реальных документов, в том числе
+направления и осмотры, где тип исследования лишь упомянут. Главное число для
+них — «уверенно неверно»: такой ответ молча отсекает специалистов.
+"""
+
+import statistics
+import time
+from collections import Counter
+
+from doc_classifier import classify, CONFIDENT
+
+REPEATS = 200
+
+FIXTURES = [
+    ("EEG", "Заключение ЭЭГ. Видео-ЭЭГ мониторинг дневного сна. Фоновая активность: альфа-ритм 8 Гц. "
+            "Регистрируются эпилептиформные разряды — комплексы острая волна — медленная волна в лобных отведениях. "
+            "Гипервентиляция и фотостимуляция без изменений."),
+    ("EEG", "EEG report. Background activity: posterior alpha rhythm 9 Hz. Frequent epileptiform discharges, "
+            "spike and wave complexes over the left temporal region during sleep."),
+    ("MRI", "МРТ головного мозга. На серии МР-томограмм в режимах Т1, Т2, FLAIR и DWI: боковые желудочки не расширены. "
+            "Очаговых изменений белого вещества не выявлено. Мозолистое тело сформировано правильно."),
+    ("MRI", "MRI brain without contrast. T2 and FLAIR sequences show scattered white matter hyperintensities. "
+            "Ventricles are normal in size. Corpus callosum intact."),
+    ("PRESCRIPTION", "Рецепт. Rp.: Депакин хроно 300 мг, по 1 табл 2 раза в день. Леветирацетам 250 мг по 1 табл утром."),
+    ("PRESCRIPTION", "Prescription: Risperidone 0.5 mg, 1 tablet twice daily. Melatonin 3 mg once daily at bedtime. Sig: as directed."),
+    ("PROTOCOL", "Протокол лечения. Схема титрации: неделя 1 — 125 мг, неделя 2 — 250 мг, неделя 3 — 375 мг. "
+                 "Повышение дозы каждые 7 дней под контролем ЭЭГ. Курс лечения 6 месяцев."),
+    ("PROTOCOL", "Treatment protocol: titrate topiramate, week 1 12.5 mg, week 2 25 mg, week 3 50 mg. Taper if side effects occur."),
+    ("HISTORY", "Выписной эпикриз. История болезни № 4521. Анамнез: беременность протекала с угрозой прерывания. "
+                "Госпитализирован в 2019 г., повторно в 2021 г. Выписка из медицинской карты."),
+    ("HISTORY", "Discharge summary. Medical history: born at 36 weeks, first seizure at 14 months, hospitalized in 2020 and 2022."),
+    ("CONSULTATION", "Консультация невролога. Жалобы: нарушение сна, стереотипии. Неврологический статус: черепные нервы без патологии. "
+                     "Заключение невролога: задержка речевого развития. Рекомендовано: наблюдение."),
+    ("CONSULTATION", "Psychiatry consultation. Complaints: aggression, poor sleep. Mental status exam: limited eye contact. "
+                     "Impression: ASD level 2. Recommended: ABA therapy."),
+    ("LAB", "Общий анализ крови. Гемоглобин 128 г/л (норма 110–140). Лейкоциты 6,2. Тромбоциты 250. "
+            "Биохимический анализ: глюкоза 4,8 ммоль/л, АЛТ 18 ед/л. Референсные значения указаны."),
+    ("LAB", "Lab results (CBC): hemoglobin 12.1 g/dL, leukocyte count 7.2, platelet count 260. Glucose 88 mg/dL, reference range 70–99."),
+    ("MIXED", "Выписка. Заключение ЭЭГ: эпилептиформная активность в височных отведениях. "
+              "МРТ головного мозга: в режиме FLAIR очаги в белом веществе. Общий анализ крови: гемоглобин 120 г/л, норма."),
+    ("MIXED", "Summary packet. EEG: epileptiform spikes. MRI: T2 white matter changes. CBC: hemoglobin normal, reference range attached."),
+]
+
+
+HELD_OUT = [
+    ("EEG", "Рутинная запись в состоянии пассивного бодрствования. Основной ритм в затылочных отведениях 8–9 Гц, "
+            "амплитудой до 60 мкВ, реакция на открывание глаз сохранена. При ритмической фотостимуляции усвоение "
+            "ритма в диапазоне 6–12 Гц. Пароксизмальной активности не зарегистрировано. Заключение: возрастная норма."),
+    ("EEG", "Routine awake and drowsy recording, 21 channels, 10-20 system. Posterior dominant rhythm 8.5 Hz, reactive "
+            "to eye opening. No focal slowing. Photic stimulation produced no abnormal response. Impression: normal study."),
+    ("MRI", "Исследование выполнено на томографе 1,5 Тл. Срединные структуры не смещены. Боковые желудочки симметричны, "
+            "не расширены. Субарахноидальные пространства не изменены. Заключение: МР-картина без патологических изменений."),
+    ("PRESCRIPTION", "Леветирацетам (Кеппра) 500 мг — по 1 таблетке утром и вечером. Мелатонин 3 мг за 30 минут до сна. "
+                     "Повторный приём через 3 месяца."),
+    ("PROTOCOL", "Вальпроевая кислота: первые 7 дней 10 мг/кг/сут, затем увеличение на 5 мг/кг каждую неделю "
+                 "до 30 мг/кг/сут. Контроль печёночных ферментов через 1 месяц, при нормальных значениях — раз в 3 месяца."),
+    ("LAB", "Клинический анализ крови от 12.03.2024. Гемоглобин 131 г/л. Эритроциты 4,6 ×10¹²/л. Лейкоциты 5,8 ×10⁹/л. "
+            "СОЭ 6 мм/ч. Ферритин 18 мкг/л (референсный интервал 20–200)."),
+    ("HISTORY", "Ребёнок от второй беременности, роды в срок, вес 3400 г. Раннее развитие по возрасту. С 2 лет родители "
+                "отмечают регресс речи, в 2021 г. установлен диагноз РАС. Получал занятия с логопедом и дефектологом."),
+    ("HISTORY", "Discharge letter. Admitted with prolonged febrile seizure. Medications on discharge: levetiracetam 250 mg "
+                "twice daily. Follow-up with neurology in 6 weeks."),
+    ("CONSULTATION", "Направление на ЭЭГ. Диагноз направившего: F84.0. Цель исследования: исключить эпилептиформную "
+                     "активность. Врач-невролог Иванова А. П."),
+    ("CONSULTATION", "Приём невролога. Жалобы мамы на нарушения сна, эпизоды замирания до 10 секунд. Рекомендовано: "
+                     "ЭЭГ-мониторинг сна, МРТ головного мозга, консультация генетика."),
+    ("CONSULTATION", "Осмотр педиатра. Состояние удовлетворительное, соматически здоров. Назначено: рецепт на мелатонин, "
+                     "контроль через месяц."),
+    ("MIXED", "Пакет документов. ЭЭГ сна: региональная эпилептиформная активность справа. МРТ головного мозга: "
+              "без патологии. Общий анализ крови в норме, ферритин снижен."),
+]
+
+
+def run(fixtures: list) -> dict:
+    latencies = []
+    correct = 0
+    confident = 0
+    confident_correct = 0
+    confusion = Counter()
+
+    wrong_confident = 0
+    for label, text in fixtures:
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            predicted, confidence = classify(text)
+        latencies.append((time.perf_counter() - start) / REPEATS * 1e6)
+
+        ok = predicted == label
+        correct += ok
+        if confidence >= CONFIDENT:
+            confident += 1
+            confident_correct += ok
+            wrong_confident += not ok
+        confusion[(label, predicted)] += 1
+        mark = "✓" if ok else "✗"
+        print(f"{mark} {label:<13} → {predicted:<13} уверенность {confidence:.2f}")
+
+    n = len(fixtures)
+    print("-" * 50)
+    print(f"Точность:                {correct}/{n} = {correct / n:.0%}")
+    print(f"Уверенных (без LLM):     {confident}/{n} = {confident / n:.0%}")
+    if confident:
+        print(f"Точность среди уверенных: {confident_correct}/{confident} = {confident_correct / confident:.0%}")
+    print(f"Уверенно неверно:        {wrong_confident}/{n}")
+    print(f"Задержка: медиана {statistics.median(latencies):.0f} мкс, максимум {max(latencies):.0f} мкс")
+
+    errors = [(k, v) for k, v in confusion.items() if k[0] != k[1]]
+    if errors:
+        print("Ошибки (истина → ответ):")
+        for (label, predicted), count in errors:
+            print(f"   {label} → {predicted}: {count}")
+
+
+def main():
+    print("Примеры по списку признаков")
+    run(FIXTURES)
+    print()
+    print("Отложенные примеры (реальные формулировки)")
+    run(HELD_OUT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Yasno — PDF extraction benchmark
+Запуск: python3 bench_pdf_extract.py [50 500 2000]
+
+Генерирует синтетические PDF и меряет iter_pdf_pages при разном числе процессов.
+"""
+
+import os
+import sys
+import time
+
+import fitz
+
+import pdf_extract
+from process_pool import worker_counts
+
+LINES_PER_PAGE = 45
+REPEATS = 3
+
+
+def make_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        text = "\n".join(
+            f"Page {p + 1} line {i}: EEG 2021-03-{i % 28 + 1:02d}, valproate 300 mg, follow-up notes"
+            for i in range(LINES_PER_PAGE)
+        )
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def extract_text(data: bytes, workers: int) -> str:
+    return "".join(pdf_extract.iter_pdf_pages(data, workers))
+
+
+def measure(data: bytes, workers: int) -> float:
+    extract_text(data, workers)  # прогрев пула
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        extract_text(data, workers)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [50, 500, 2000]
+    counts = worker_counts()
+
+    print(f"Ядер: {os.cpu_count()}, повторов: {REPEATS} (лучшее время)")
+    print(f"{'страниц':>8} {'процессов':>10} {'сек':>8} {'ускорение':>10}")
+    print("-" * 40)
+    for pages in sizes:
+        data = make_pdf(pages)
+        baseline = None
+        for workers in counts:
+            elapsed = measure(data, workers)
+            baseline = baseline or elapsed
+            print(f"{pages:>8} {workers:>10} {elapsed:>8.3f} {baseline / elapsed:>9.2f}x")
+        print()
+
+
+if __name__ == "__main__":
+    main()
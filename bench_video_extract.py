@@ -0,0 +1,110 @@
+"""
+Yasno — video frame extraction benchmark
+Запуск: python3 bench_video_extract.py [30 120 600]
+
+Генерирует синтетические видео (длина в секундах) и меряет стратегии
+video_frames.read_frames при разном числе кадров на видео, затем —
+адаптивное сканирование (video_frames.activity_profile) при разном числе процессов.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import video_frames
+from process_pool import worker_counts
+
+FPS = 30
+SIZE = (640, 360)
+SAMPLE_COUNTS = [12, 48, 240]
+REPEATS = 3
+
+
+def make_video(path: str, seconds: int):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), FPS, SIZE)
+    w, h = SIZE
+    yy, xx = np.mgrid[0:h, 0:w]
+    base = ((xx + yy) % 256).astype(np.uint8)
+    for i in range(seconds * FPS):
+        frame = np.dstack([base, np.roll(base, i, axis=1), np.full_like(base, i % 256)])
+        x = (i * 7) % (w - 60)
+        cv2.rectangle(frame, (x, 100), (x + 60, 160), (255, 255, 255), -1)
+        cv2.putText(frame, str(i), (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        writer.write(frame)
+    writer.release()
+
+
+def run(path: str, num_frames: int, strategy: str) -> tuple:
+    cap, info = video_frames.open_video(path)
+    indices = video_frames.uniform_indices(info["total_frames"], num_frames)
+    start = time.perf_counter()
+    frames = list(video_frames.read_frames(cap, indices, strategy))
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return elapsed, frames
+
+
+def measure(path: str, num_frames: int, strategy: str) -> tuple:
+    best = float("inf")
+    frames = []
+    for _ in range(REPEATS):
+        elapsed, frames = run(path, num_frames, strategy)
+        best = min(best, elapsed)
+    return best, frames
+
+
+def measure_scan(path: str, workers: int) -> float:
+    cap, info = video_frames.open_video(path)
+    cap.release()
+    video_frames.activity_profile(path, info, workers=workers)  # прогрев пула
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        video_frames.activity_profile(path, info, workers=workers)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    lengths = [int(a) for a in sys.argv[1:]] or [30, 120, 600]
+
+    print(f"Видео {SIZE[0]}x{SIZE[1]} @ {FPS} fps, повторов: {REPEATS} (лучшее время)")
+    print(f"{'сек':>6} {'кадров':>7} " + " ".join(f"{s:>11}" for s in video_frames.STRATEGIES) + "  совпадают")
+    print("-" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        for seconds in lengths:
+            path = paths[seconds] = os.path.join(tmp, f"synthetic_{seconds}.mp4")
+            make_video(path, seconds)
+            for num_frames in SAMPLE_COUNTS:
+                results = {s: measure(path, num_frames, s) for s in video_frames.STRATEGIES}
+                reference = results["seek"][1]
+                same = all(
+                    len(frames) == len(reference)
+                    and all(i == j and np.array_equal(a, b) for (i, a), (j, b) in zip(frames, reference))
+                    for _, frames in results.values()
+                )
+                print(f"{seconds:>6} {num_frames:>7} "
+                      + " ".join(f"{results[s][0]:>10.3f}s" for s in video_frames.STRATEGIES)
+                      + f"  {'да' if same else 'НЕТ'}")
+
+        print()
+        print(f"Сканирование активности, ядер: {os.cpu_count()} "
+              f"(параллельно от {video_frames.PARALLEL_MIN_SECONDS} сек видео)")
+        print(f"{'сек':>6} {'процессов':>10} {'сек':>8} {'ускорение':>10}")
+        print("-" * 40)
+        for seconds, path in paths.items():
+            base = None
+            for workers in worker_counts():
+                elapsed = measure_scan(path, workers)
+                base = base or elapsed
+                print(f"{seconds:>6} {workers:>10} {elapsed:>8.2f} {base / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
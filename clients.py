@@ -0,0 +1,99 @@
+"""
+Yasno — process-wide OpenAI clients.
+
+One client per API key with a tuned, keep-alive HTTP pool, shared by the chat
+path, the council and the video CLI across Streamlit reruns and sessions.
+
+Async clients are tied to the event loop they run on (httpx connections
+cannot move between loops), so they are cached per (loop, API key).
+"""
+
+import os
+import threading
+import weakref
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    import h2  # noqa: F401 — HTTP/2 в httpx работает только с этим пакетом
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+MAX_CONNECTIONS = int(os.environ.get("YASNO_HTTP_MAX_CONNECTIONS", 50))
+MAX_KEEPALIVE = int(os.environ.get("YASNO_HTTP_MAX_KEEPALIVE", 20))
+KEEPALIVE_EXPIRY = float(os.environ.get("YASNO_HTTP_KEEPALIVE_EXPIRY", 90))
+TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+MAX_RETRIES = 2
+
+
+def _limits():
+    return httpx.Limits(max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_KEEPALIVE,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+_lock = threading.Lock()
+_sync_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # loop -> {api_key: AsyncOpenAI}
+_counters = {"created": 0, "reused": 0}
+
+
+def get_client(api_key: str) -> OpenAI:
+    with _lock:
+        client = _sync_clients.get(api_key)
+        if client is None:
+            http_client = httpx.Client(limits=_limits(), timeout=TIMEOUT, http2=HTTP2)
+            client = OpenAI(api_key=api_key, http_client=http_client, max_retries=MAX_RETRIES)
+            _sync_clients[api_key] = client
+            _counters["created"] += 1
+        else:
+            _counters["reused"] += 1
+        return client
+
+
+def get_async_client(api_key: str, loop=None) -> AsyncOpenAI:
+    """Client bound to `loop` (default: the running loop)."""
+    if loop is None:
+        import asyncio
+        loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _async_clients.setdefault(loop, {})
+        client = per_loop.get(api_key)
+        if client is None:
+            http_client = httpx.AsyncClient(limits=_limits(), timeout=TIMEOUT, http2=HTTP2)
+            client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=MAX_RETRIES)
+            per_loop[api_key] = client
+            _counters["created"] += 1
+        else:
+            _counters["reused"] += 1
+        return client
+
+
+def _pool_connections(client) -> dict:
+    # httpx не даёт публичного API для пула — смотрим в httpcore, если получится
+    try:
+        pool = client._client._transport._pool
+        connections = list(pool.connections)
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+    except Exception:
+        return {}
+
+
+def pool_stats() -> dict:
+    with _lock:
+        sync_clients = list(_sync_clients.values())
+        async_clients = [c for per_loop in _async_clients.values() for c in per_loop.values()]
+        counters = dict(_counters)
+    return {
+        "http2": HTTP2,
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive": MAX_KEEPALIVE,
+        "sync_clients": len(sync_clients),
+        "async_clients": len(async_clients),
+        "created": counters["created"],
+        "reused": counters["reused"],
+        "connections": [_pool_connections(c) for c in sync_clients + async_clients],
+    }
@@ -0,0 +1,214 @@
+"""
+Yasno — content-addressed cache.
+
+Two tiers:
+- memory: LRU bounded by total bytes, lives as long as the process
+- disk: one pickle per key, oldest-accessed files evicted past a size limit
+
+Keys are SHA-256 hex digests of the content they describe, so the same
+bytes uploaded again (another rerun, another session) hit the cache.
+Caches with a ttl also expire entries by age, in both tiers.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DIR = os.environ.get("YASNO_CACHE_DIR", ".yasno_cache")
+MEMORY_LIMIT = 64 * 1024 * 1024      # байт в памяти на один кэш
+DISK_LIMIT = 512 * 1024 * 1024       # байт на диске на один кэш
+
+
+def content_hash(data) -> str:
+    """SHA-256 of bytes or str."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class ContentCache:
+    def __init__(self, name: str, memory_limit: int = MEMORY_LIMIT, disk_limit: int = DISK_LIMIT,
+                 cache_dir: str = CACHE_DIR, ttl: float = None):
+        self.name = name
+        self.ttl = ttl
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.dir = os.path.join(cache_dir, name) if cache_dir else None
+        self._memory = OrderedDict()  # key -> (value, size, created)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _fresh(self, created):
+        return self.ttl is None or time.time() - created <= self.ttl
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            if key in self._memory:
+                value, size, created = self._memory[key]
+                if self._fresh(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._memory_bytes -= size
+                del self._memory[key]
+                self.expired += 1
+
+        blob = self._read_disk(key)
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return default
+
+        try:
+            value = pickle.loads(blob)
+            created = time.time()
+            if self.ttl is not None:
+                created, value = value
+        except Exception:
+            self._remove_disk(key)
+            with self._lock:
+                self.misses += 1
+            return default
+
+        if not self._fresh(created):
+            self._remove_disk(key)
+            with self._lock:
+                self.expired += 1
+                self.misses += 1
+            return default
+
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value, len(blob), created)
+        return value
+
+    def put(self, key: str, value):
+        created = time.time()
+        stored = (created, value) if self.ttl is not None else value
+        blob = pickle.dumps(stored, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, value, len(blob), created)
+        self._write_disk(key, blob)
+
+    def get_or_compute(self, key: str, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.dir and os.path.isdir(self.dir):
+            for entry in os.listdir(self.dir):
+                self._remove_disk(entry)
+
+    # ─── memory tier ──────────────────────────────────
+
+    def _remember(self, key, value, size, created):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        if size > self.memory_limit:
+            return
+        self._memory[key] = (value, size, created)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_limit:
+            _, (_, old_size, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= old_size
+
+    # ─── disk tier ────────────────────────────────────
+
+    def _path(self, key):
+        return os.path.join(self.dir, key)
+
+    def _read_disk(self, key):
+        if not self.dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)  # mtime = последнее обращение, для вытеснения
+            return blob
+        except OSError:
+            return None
+
+    def _write_disk(self, key, blob):
+        if not self.dir or len(blob) > self.disk_limit:
+            return
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            tmp = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, self._path(key))
+            self._evict_disk()
+        except OSError:
+            pass
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.name))
+            total += st.st_size
+        if total <= self.disk_limit:
+            return
+        entries.sort()
+        for _, size, name in entries:
+            self._remove_disk(name)
+            total -= size
+            if total <= self.disk_limit:
+                break
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, ttl: float = None) -> ContentCache:
+    """Process-wide cache by name — survives Streamlit reruns and is shared by sessions."""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = ContentCache(name, ttl=ttl)
+        return _caches[name]
+
+
+def all_stats() -> list:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [c.stats() for c in caches]
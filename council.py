@@ -1,97 +1,547 @@
 import asyncio
-from openai import AsyncOpenAI
-from agents.router import ROUTER_PROMPT
-from agents.neurologist import NEUROLOGIST_PROMPT
-from agents.pediatrician import PEDIATRICIAN_PROMPT
-from agents.psychiatrist import PSYCHIATRIST_PROMPT
-from agents.navigator import NAVIGATOR_PROMPT
-from agents.editor import EDITOR_PROMPT
+import random
+import time
+from collections import defaultdict, deque
 
+import openai
+from clients import get_async_client
+from async_runtime import run_sync, iterate_sync
+from doc_classifier import classify, CONFIDENT
+from content_cache import get_cache, content_hash
+from doc_index import split_document
+from message_budget import count_tokens
+from rate_limiter import get_limiter, estimate_tokens, PRIORITY_COUNCIL
+from agents.registry import TOOLS, MODEL, agent, specialists
 
-async def call_agent(client, system_prompt, document_text, agent_name):
+
+RESULT_TTL = 7 * 24 * 3600  # ответы агентов по тем же документам живут неделю
+AGENT_DEADLINE = 45.0      # сек на специалиста — кто не успел, идёт без него
+AGENT_MAX_TOKENS = 800
+EDITOR_DEADLINE = 60.0
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+HEDGE_PERCENTILE = 0.9     # дублируем запрос, если он дольше p90 прошлых
+HEDGE_MIN_SAMPLES = 10
+RETRYABLE = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+_latencies = defaultdict(lambda: deque(maxlen=200))  # agent_name -> секунды успешных запросов
+_web_search = {"supported": True}
+_results = get_cache("council-results", ttl=RESULT_TTL)
+
+
+def result_key(system_prompt: str, doc_type: str, text: str, model: str = MODEL) -> str:
+    """(agent prompt hash, model, doc type, input hash) — the input holds the document set."""
+    return content_hash("\x00".join([content_hash(system_prompt), model, doc_type or "", content_hash(text)]))
+
+
+def tool_rejected(error: openai.BadRequestError) -> bool:
+    """Whether a 400 is about the tools parameter itself, not about this particular request."""
+    return getattr(error, "param", None) == "tools" or "web_search" in str(error)
+
+
+def hedge_delay(agent_name: str):
+    samples = sorted(_latencies[agent_name])
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE))]
+
+
+async def _throttle(client, messages, max_tokens):
+    """Wait for the shared per-key RPM/TPM budget, behind interactive chat."""
+    await get_limiter(client.api_key).acquire_async(estimate_tokens(messages, max_tokens), PRIORITY_COUNCIL)
+
+
+NO_ANSWER = "[нет ответа]"
+
+
+async def _request(client, messages, agent_name, tools, model, max_tokens, temperature=0.3):
+    kwargs = {"tools": tools} if tools else {}
+    await _throttle(client, messages, max_tokens)
+    start = time.perf_counter()
+    response = await client.with_options(max_retries=0).chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        **kwargs
+    )
+    _latencies[agent_name].append(time.perf_counter() - start)
+    return response.choices[0].message.content or NO_ANSWER
+
+
+async def _with_retries(client, messages, agent_name, tools, model, max_tokens, temperature=0.3):
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await _request(client, messages, agent_name, tools, model, max_tokens, temperature)
+        except RETRYABLE:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            # Экспоненциальная задержка с полным джиттером
+            await asyncio.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+
+async def _hedged(client, messages, agent_name, tools, model, max_tokens):
+    primary = asyncio.create_task(_with_retries(client, messages, agent_name, tools, model, max_tokens))
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": document_text}
-            ],
-            tools=[{"type": "web_search_preview"}],
-            max_tokens=800,
-            temperature=0.3
-        )
-        return agent_name, response.choices[0].message.content or "[нет ответа]"
-    except Exception as e:
-        # Fallback without web search
+        delay = hedge_delay(agent_name)
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done:
+                backup = asyncio.create_task(_with_retries(client, messages, agent_name, tools, model, max_tokens))
+                pending = {primary, backup}
+                error = None
+                try:
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            if task.exception() is None:
+                                return task.result()
+                            error = task.exception()
+                    raise error
+                finally:
+                    for task in pending:
+                        task.cancel()
+        return await primary
+    finally:
+        # Любой выход, включая отмену снаружи (дедлайн call_agent), гасит запрос
+        primary.cancel()
+
+
+async def _call(client, system_prompt, document_text, agent_name, doc_type=None, cache_text=None,
+                model=MODEL, max_tokens=AGENT_MAX_TOKENS, tools=("web_search",)):
+    """Successful answers are cached under result_key(..., cache_text or document_text)."""
+    key = result_key(system_prompt, doc_type, cache_text or document_text, model)
+    cached = _results.get(key)
+    if cached is not None:
+        return cached
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": document_text}
+    ]
+    text = None
+    if tools and _web_search["supported"]:
         try:
-            response = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": document_text}
-                ],
-                max_tokens=800,
-                temperature=0.3
-            )
-            return agent_name, response.choices[0].message.content or "[нет ответа]"
-        except Exception as e2:
-            return agent_name, "[" + agent_name + ": " + str(e2) + "]"
-
-
-async def run_council(api_key: str, document_text: str) -> str:
+            text = await _hedged(client, messages, agent_name, [TOOLS[t] for t in tools], model, max_tokens)
+        except openai.BadRequestError as e:
+            # Модель/эндпоинт не принимает инструмент — больше не пробуем в этом процессе.
+            # Остальные 400 (длина контекста, фильтр) касаются только этого запроса.
+            if tool_rejected(e):
+                _web_search["supported"] = False
+        except Exception:
+            pass
+    if text is None:
+        # Fallback without tools
+        try:
+            text = await _hedged(client, messages, agent_name, None, model, max_tokens)
+        except Exception as e:
+            return "[" + agent_name + ": " + str(e) + "]"
+    _results.put(key, text)
+    return text
+
+
+def agent_params(spec: dict) -> dict:
+    """model/max_tokens/tools of a registry entry, as keyword arguments for call_agent."""
+    return {"model": spec["model"], "max_tokens": spec["max_tokens"], "tools": tuple(spec.get("tools", ()))}
+
+
+async def call_agent(client, system_prompt, document_text, agent_name, deadline=AGENT_DEADLINE, doc_type=None,
+                     **params):
     """
-    Run full council analysis on a document.
-    Returns assembled response from all agents.
+    Returns (agent_name, text). Retryable API errors are retried with jittered
+    backoff, slow requests are hedged with a duplicate after the agent's p90
+    latency. Raises asyncio.TimeoutError if the agent misses its deadline.
+    Answers are cached per (prompt, model, doc type, input) for RESULT_TTL.
+    `params` (see agent_params) override the default model, max_tokens and tools.
+    """
+    return agent_name, await asyncio.wait_for(
+        _call(client, system_prompt, document_text, agent_name, doc_type, **params), deadline)
+
+
+SPECIALISTS = specialists()
+DOC_TYPES = {t for spec in SPECIALISTS.values() for t in spec["doc_types"] or []}
+
+
+def select_agents(doc_type: str) -> list:
+    """Specialists declared for this doc type, in registry order; all of them for other types."""
+    doc_type = doc_type.strip(" .").upper()
+    if doc_type not in DOC_TYPES:
+        return list(SPECIALISTS)
+    return [name for name, spec in SPECIALISTS.items() if spec["doc_types"] is None or doc_type in spec["doc_types"]]
+
+
+def colleague_notes(deps: list, answers: dict) -> str:
+    """Answers of the specialists this one depends on, to append to its input."""
+    notes = ""
+    for dep in deps:
+        notes += f"=== {dep} ===\n{answers.get(dep) or '[не ответил]'}\n\n"
+    return "\n\nОТВЕТЫ КОЛЛЕГ ПО КОНСИЛИУМУ:\n\n" + notes if notes else ""
+
+
+# Документ больше MAP_REDUCE_TOKENS не влезет в один запрос: специалисты читают
+# его частями по PART_TOKENS (map), затем сводят свои находки (reduce)
+MAP_REDUCE_TOKENS = 60000
+PART_TOKENS = 30000
+MAP_CONCURRENCY = 8         # одновременных запросов по частям на весь консилиум
+MAP_REDUCE_DEADLINE = 150.0
+
+MAP_INSTRUCTION = (
+    "Документ слишком большой, ты читаешь его частями. Это часть {i} из {n}.\n"
+    "Выпиши только находки по своей специальности в этой части — кратко, с датами и цифрами. "
+    "Итоговый ответ дашь позже."
+)
+REDUCE_INSTRUCTION = (
+    "Документ был слишком большим, ты прочитал его частями. Ниже твои находки по каждой части.\n"
+    "Теперь дай итоговый ответ по всему документу в своём обычном формате."
+)
+
+
+async def call_agent_chunked(client, system_prompt, header, parts, agent_name, semaphore,
+                             deadline=MAP_REDUCE_DEADLINE, doc_type=None, notes="", **params):
+    """
+    Map over document parts (at most MAP_CONCURRENCY calls at once), then reduce.
+    Part findings are cached by part content, not position, so after adding a
+    document only the new parts are mapped again. `notes` (colleagues' answers)
+    are only read in the reduce step.
+    """
+    async def map_part(i, part):
+        text = header + MAP_INSTRUCTION.format(i=i, n=len(parts)) + "\n\n" + part
+        async with semaphore:
+            return await _call(client, system_prompt, text, agent_name + " · часть", doc_type, header + part,
+                               **params)
+
+    async def run():
+        findings = await asyncio.gather(*[map_part(i, part) for i, part in enumerate(parts, 1)])
+        text = header + REDUCE_INSTRUCTION
+        for i, finding in enumerate(findings, 1):
+            text += f"\n\n=== Часть {i} ===\n{finding}"
+        return await _call(client, system_prompt, text + notes, agent_name, doc_type, **params)
+
+    return agent_name, await asyncio.wait_for(run(), deadline)
+
+
+CONDENSE = True
+# Выжимка — до 1500 токенов и лишний последовательный запрос перед специалистами;
+# окупается, только когда документ в разы длиннее неё
+CONDENSE_MIN_TOKENS = 8000
+CONDENSE_DEADLINE = 60.0   # не успели — специалисты читают исходный текст
+
+_fact_sheets = get_cache("fact-sheet")
+
+
+async def _condense_part(client, text: str, semaphore):
+    name, spec = agent("condenser")
+    key = content_hash(spec["prompt"] + "\x00" + spec["model"] + "\x00" + text)
+    fact_sheet = _fact_sheets.get(key)
+    if fact_sheet is not None:
+        return fact_sheet
+    messages = [
+        {"role": "system", "content": spec["prompt"]},
+        {"role": "user", "content": text}
+    ]
+    try:
+        async with semaphore:
+            fact_sheet = await _with_retries(client, messages, name, None, spec["model"], spec["max_tokens"],
+                                             temperature=0)
+    except Exception:
+        return None
+    fact_sheet = fact_sheet.strip()
+    if not fact_sheet or fact_sheet == NO_ANSWER:
+        return None
+    _fact_sheets.put(key, fact_sheet)
+    return fact_sheet
+
+
+async def condense_document(client, document_text: str, semaphore=None):
+    """
+    Fact sheet (meds, dates, findings, tests) for the document, computed once
+    per document hash and cached across councils. Documents larger than
+    PART_TOKENS are condensed part by part. None if any call fails.
+    Calls go through the same retry path as the specialists; the caller
+    bounds the whole stage with CONDENSE_DEADLINE.
     """
-    client = AsyncOpenAI(api_key=api_key)
+    semaphore = semaphore or asyncio.Semaphore(MAP_CONCURRENCY)
+    parts = split_document(document_text, PART_TOKENS)
+    sheets = await asyncio.gather(*[_condense_part(client, part, semaphore) for part in parts])
+    if any(sheet is None for sheet in sheets):
+        return None
+    if len(sheets) == 1:
+        return sheets[0]
+    return "\n\n".join(f"=== Часть {i} из {len(sheets)} ===\n{sheet}" for i, sheet in enumerate(sheets, 1))
 
-    # Step 1 — Determine document type
+
+ROUTER_MODE = "speculative"  # "serial": ждём тип документа до запуска специалистов
+
+
+async def route_document(client, document_text: str) -> str:
+    _, spec = agent("router")
+    messages = [
+        {"role": "system", "content": spec["prompt"]},
+        {"role": "user", "content": document_text[:1000]}
+    ]
     try:
+        await _throttle(client, messages, spec["max_tokens"])
         router_response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": ROUTER_PROMPT},
-                {"role": "user", "content": document_text[:1000]}
-            ],
-            max_tokens=10,
+            model=spec["model"],
+            messages=messages,
+            max_tokens=spec["max_tokens"],
             temperature=0
         )
-        doc_type = router_response.choices[0].message.content.strip()
-    except:
-        doc_type = "MIXED"
-
-    # Step 2 — Run all 4 specialists in parallel
-    context = f"Тип документа: {doc_type}\n\nДокумент:\n{document_text}"
-
-    tasks = [
-        call_agent(client, NEUROLOGIST_PROMPT, context, "Невролог"),
-        call_agent(client, PEDIATRICIAN_PROMPT, context, "Педиатр"),
-        call_agent(client, PSYCHIATRIST_PROMPT, context, "Психиатр"),
-        call_agent(client, NAVIGATOR_PROMPT, context, "Навигатор"),
+        return router_response.choices[0].message.content.strip()
+    except Exception:
+        return "MIXED"
+
+
+async def _settle(name, coro):
+    try:
+        return name, await coro
+    except BaseException as e:
+        return name, e
+
+
+async def _stream_editor(client, council_text, doc_type, fallback):
+    """
+    Yield the editor's answer as deltas. Served from cache when possible;
+    streamed without tools otherwise. If nothing arrives before the deadline
+    or the stream fails before its first token, the non-streaming call_agent
+    path (retries, hedging) gets the remaining time, then `fallback`.
+    """
+    editor_name, spec = agent("editor")
+    key = result_key(spec["prompt"], doc_type, council_text, spec["model"])
+    cached = _results.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + EDITOR_DEADLINE
+    parts = []
+    messages = [
+        {"role": "system", "content": spec["prompt"]},
+        {"role": "user", "content": council_text}
     ]
+    try:
+        await asyncio.wait_for(_throttle(client, messages, spec["max_tokens"]), deadline - loop.time())
+        stream = await asyncio.wait_for(client.chat.completions.create(
+            model=spec["model"],
+            messages=messages,
+            max_tokens=spec["max_tokens"],
+            temperature=0.3,
+            stream=True
+        ), deadline - loop.time())
+        iterator = stream.__aiter__()
+        while True:
+            chunk = await asyncio.wait_for(iterator.__anext__(), deadline - loop.time())
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    except StopAsyncIteration:
+        _results.put(key, "".join(parts))
+        return
+    except asyncio.TimeoutError:
+        if parts:
+            yield "\n\n_…редактор не успел закончить._"
+            return
+    except Exception:
+        if parts:
+            yield "\n\n_…ответ редактора прервался._"
+            return
+
+    try:
+        _, text = await call_agent(client, spec["prompt"], council_text, editor_name,
+                                   deadline=max(1.0, deadline - loop.time()), doc_type=doc_type,
+                                   **agent_params(spec))
+    except asyncio.TimeoutError:
+        # Редактор не успел — отдаём ответы специалистов как есть
+        text = fallback
+    yield text
+
+
+async def council_events(api_key: str, document_text: str, router_mode: str = ROUTER_MODE,
+                         use_raw_text: bool = not CONDENSE):
+    """
+    Run full council analysis on a document, as a stream of events:
 
-    results = await asyncio.gather(*tasks)
+      {"type": "router_decided", "doc_type": str, "source": "local" | "llm"}
+      {"type": "agent_started", "agent": name}
+      {"type": "agent_finished", "agent": name, "status": "ok" | "error" | "timeout", "text": str}
+      {"type": "editor_started"}
+      {"type": "editor_delta", "text": str}
+      {"type": "done", "text": final answer}
+
+    The doc type comes from the local classifier when it is confident.
+    Otherwise the LLM router is used: router_mode="speculative" starts the
+    specialists right away and lets the router run alongside them (its doc
+    type only reaches the editor), "serial" waits for it first.
+
+    Only the specialists declared for a known doc type (agents/registry.py)
+    are called; when the doc type arrives too late (speculative) all of them
+    are. A specialist with deps starts once those colleagues have answered
+    and reads their answers; the others start at once.
+
+    Long documents are condensed once into a cached fact sheet which the
+    specialists read instead of the raw text, unless use_raw_text is set.
+    The editor still gets the raw text when it fits in one request. If the
+    text is still larger than MAP_REDUCE_TOKENS, each specialist reads it in
+    parts and reduces its findings.
+    document_text may end with "|||question".
+
+    Every agent answer is cached (see result_key), so an unchanged council
+    returns at once and a changed document set reruns only what it touches.
+    """
+    client = get_async_client(api_key)
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    document, _, question = document_text.partition("|||")
+
+    # Step 1 — Determine document type (the LLM router overlaps with condensation)
+    doc_type, confidence = classify(document)
+    router_task = None
+    if confidence < CONFIDENT:
+        router_task = asyncio.create_task(route_document(client, document))
+        if router_mode == "serial":
+            doc_type = await router_task
+            router_task = None
+            yield {"type": "router_decided", "doc_type": doc_type, "source": "llm"}
+    else:
+        yield {"type": "router_decided", "doc_type": doc_type, "source": "local"}
+
+    # Step 1.5 — Shared fact sheet instead of the raw text
+    source_label = "Документ"
+    raw_text = document_text
+    document_tokens = count_tokens(document)
+    if not use_raw_text and document_tokens >= CONDENSE_MIN_TOKENS:
+        try:
+            fact_sheet = await asyncio.wait_for(condense_document(client, document, semaphore), CONDENSE_DEADLINE)
+        except asyncio.TimeoutError:
+            fact_sheet = None
+        if fact_sheet:
+            source_label = "Выжимка из документов"
+            document_text = fact_sheet + ("\n\nВопрос родителя: " + question if question else "")
+
+    header = f"Тип документа: {doc_type}\n\n" if router_task is None else ""
+    context = f"{header}{source_label}:\n{document_text}"
+
+    working_text = document_text if source_label != "Документ" else document
+    parts = None
+    if count_tokens(working_text) > MAP_REDUCE_TOKENS:
+        parts = split_document(working_text, PART_TOKENS)
+        if question:
+            header += f"Вопрос родителя: {question}\n\n"
+
+    # Step 2 — Run the relevant specialists as a DAG: each starts as soon as
+    # the colleagues it depends on (among those called) have finished
+    agent_names = select_agents(doc_type) if router_task is None else list(SPECIALISTS)
+    deps = {name: [d for d in SPECIALISTS[name]["deps"] if d in agent_names] for name in agent_names}
+    waiting = list(agent_names)
+    running = {}
+    outcomes = {}
+    answers = {}
+
+    def start(name):
+        spec = SPECIALISTS[name]
+        notes = colleague_notes(deps[name], answers)
+        if parts:
+            coro = call_agent_chunked(client, spec["prompt"], header, parts, name, semaphore,
+                                      doc_type=doc_type, notes=notes, **agent_params(spec))
+        else:
+            coro = call_agent(client, spec["prompt"], context + notes, name, doc_type=doc_type,
+                              **agent_params(spec))
+        running[asyncio.create_task(_settle(name, coro))] = name
+
+    try:
+        while waiting or running:
+            for name in [n for n in waiting if all(d in outcomes for d in deps[n])]:
+                waiting.remove(name)
+                start(name)
+                yield {"type": "agent_started", "agent": name}
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del running[task]
+                name, outcome = task.result()
+                outcomes[name] = outcome
+                if isinstance(outcome, asyncio.TimeoutError):
+                    yield {"type": "agent_finished", "agent": name, "status": "timeout", "text": ""}
+                elif isinstance(outcome, BaseException):
+                    yield {"type": "agent_finished", "agent": name, "status": "error", "text": str(outcome)}
+                else:
+                    status = "error" if outcome[1].startswith("[" + name + ":") else "ok"
+                    if status == "ok":
+                        answers[name] = outcome[1]
+                    yield {"type": "agent_finished", "agent": name, "status": status, "text": outcome[1]}
+    finally:
+        for task in running:
+            task.cancel()
+
+    if router_task is not None:
+        doc_type = await router_task
+        yield {"type": "router_decided", "doc_type": doc_type, "source": "llm"}
+
+    results = []
+    timed_out = []
+    for name in agent_names:
+        outcome = outcomes[name]
+        if isinstance(outcome, asyncio.TimeoutError):
+            timed_out.append(name)
+        elif isinstance(outcome, BaseException):
+            results.append((name, "[" + name + ": " + str(outcome) + "]"))
+        else:
+            results.append(outcome)
 
     # Step 3 — Assemble all responses for editor
-    council_text = f"Тип документа: {doc_type}\n\n"
+    council_text = f"Тип документа: {doc_type}\n"
+    council_text += "В консилиуме участвовали: " + ", ".join(name for name, _ in results) + "\n"
+    if timed_out:
+        council_text += "Не успели ответить: " + ", ".join(timed_out) + "\n"
+    council_text += "\n"
     council_text += "ОТВЕТЫ СПЕЦИАЛИСТОВ:\n\n"
 
     for agent_name, response in results:
         council_text += f"=== {agent_name} ===\n{response}\n\n"
 
-    council_text += f"\nОРИГИНАЛЬНЫЙ ДОКУМЕНТ:\n{document_text}"
+    if parts:
+        council_text += f"\n(Документ большой — {len(parts)} частей, специалисты разобрали его по частям; исходный текст не приводится.)"
+        if question:
+            council_text += f"\n\nВопрос родителя: {question}"
+    elif source_label == "Документ" or document_tokens <= MAP_REDUCE_TOKENS:
+        council_text += f"\nОРИГИНАЛЬНЫЙ ДОКУМЕНТ:\n{raw_text}"
+    else:
+        council_text += f"\n{source_label.upper()}:\n{document_text}"
 
-    # Step 4 — Editor assembles final response
-    _, final_response = await call_agent(
-        client,
-        EDITOR_PROMPT,
-        council_text,
-        "Редактор"
-    )
+    # Step 4 — Editor assembles final response, streamed
+    yield {"type": "editor_started"}
+    fallback = "\n\n".join(f"**{name}:** {response}" for name, response in results)
+    final_parts = []
+    async for delta in _stream_editor(client, council_text, doc_type, fallback):
+        final_parts.append(delta)
+        yield {"type": "editor_delta", "text": delta}
+
+    final_response = "".join(final_parts)
+    if timed_out:
+        final_response += "\n\n_Не успели ответить вовремя: " + ", ".join(timed_out) + "_"
+    yield {"type": "done", "text": final_response}
 
+
+async def run_council(api_key: str, document_text: str, router_mode: str = ROUTER_MODE,
+                      use_raw_text: bool = not CONDENSE) -> str:
+    """
+    Run full council analysis on a document.
+    Returns assembled response from all agents (see council_events).
+    """
+    final_response = ""
+    async for event in council_events(api_key, document_text, router_mode, use_raw_text):
+        if event["type"] == "done":
+            final_response = event["text"]
     return final_response
 
 
 def run_council_sync(api_key: str, document_text: str) -> str:
-    """Synchronous wrapper for Streamlit"""
-    return asyncio.run(run_council(api_key, document_text))
+    """Synchronous wrapper for Streamlit — runs on the shared background loop"""
+    return run_sync(run_council(api_key, document_text))
+
+
+def council_events_sync(api_key: str, document_text: str):
+    """Iterate council_events from sync code (Streamlit) via the shared loop"""
+    return iterate_sync(council_events(api_key, document_text))
@@ -0,0 +1,94 @@
+"""
+Yasno — local document-type classifier.
+
+Russian/English keyword and regex features, weighted per type. Runs in
+microseconds on the start of the document and returns a confidence; the
+council falls back to the ROUTER_PROMPT LLM call only when it is low.
+Types are the same as in agents/router.py.
+"""
+
+import re
+
+HEAD_CHARS = 4000
+MIN_SCORE = 3.0           # меньше — признаков не хватает, спрашиваем LLM
+MIXED_RATIO = 0.7         # второй тип набрал столько от первого — MIXED
+CONFIDENT = 0.6
+STRONG_FEATURES = 3       # столько разных признаков типа — улик достаточно
+STRONG_SCORE = 12.0       # столько баллов у типа — улик достаточно
+
+FEATURES = {
+    "EEG": [
+        (r"\bээг\b|электроэнцефалограф|видео-?ээг|\beeg\b|electroencephalogra", 4),
+        (r"эпилептиформ|epileptiform|спайк|spike|пик-волн|острая волна|sharp wave", 2),
+        (r"альфа-ритм|alpha rhythm|фоновая активность|background activity|гипервентиляц|фотостимуляц", 2),
+    ],
+    "MRI": [
+        (r"\bмрт\b|\bкт\b|магнитно-резонанс|компьютерн\w* томограф|\bmri\b|\bct scan|\bmr imaging", 4),
+        (r"\bt1\b|\bt2\b|\bflair\b|\bdwi\b|режим\w* т[12]|контраст", 2),
+        (r"желудоч|белое вещество|white matter|субарахноид|мозолист|corpus callosum|очаг\w* поражения", 2),
+    ],
+    "PRESCRIPTION": [
+        (r"\bрецепт|\brp\.|prescription|\bsig\b", 4),
+        (r"\d+\s?(мг|mg|мл|ml)\b", 1),
+        (r"раз\w* в (день|сутки)|\bтабл|\bкапс|twice daily|once daily|\bbid\b|\btid\b", 1.5),
+    ],
+    "PROTOCOL": [
+        (r"протокол лечения|схема лечения|план лечения|treatment protocol|treatment plan", 4),
+        (r"титрац|titrat|курс лечения|этап\w* лечения|повышение дозы|снижение дозы|taper", 2),
+        (r"\bнеделя \d|\bweek \d|\bдень \d+", 1),
+    ],
+    "HISTORY": [
+        (r"история болезни|выписк|эпикриз|медицинская карта|discharge summary|medical history|case history", 4),
+        (r"анамнез|anamnesis|past history|госпитализ|hospitali[sz]", 2),
+        (r"\b(19|20)\d{2}\s?г", 0.5),
+    ],
+    "CONSULTATION": [
+        (r"консультаци|consultation|осмотр \w+|заключение (врача|специалиста|невролога|психиатра)", 4),
+        (r"жалоб|complaints|рекомендовано|recommended|на приёме|на приеме|impression", 1.5),
+        (r"неврологический статус|психический статус|mental status|neurological exam", 2),
+    ],
+    "LAB": [
+        (r"анализ крови|общий анализ|биохими|клинический анализ|blood test|lab(oratory)? results|\bcbc\b", 4),
+        (r"референс|reference range|норма\b|гемоглобин|hemoglobin|лейкоцит|leukocyte|тромбоцит|platelet", 2),
+        (r"ммоль/л|мкмоль/л|г/л|mmol/l|mg/dl|ед/л|u/l", 1.5),
+    ],
+}
+
+_compiled = {t: [(re.compile(p, re.IGNORECASE), w) for p, w in feats] for t, feats in FEATURES.items()}
+
+
+def score(text: str) -> dict:
+    """{doc_type: (score, number of distinct features that matched)}."""
+    head = text[:HEAD_CHARS]
+    scores = {}
+    for doc_type, feats in _compiled.items():
+        total = 0.0
+        matched = 0
+        for pattern, weight in feats:
+            hits = len(pattern.findall(head))
+            if hits:
+                # Повторы помогают, но убывающе: 1, 1.5, 1.75...
+                total += weight * (2 - 0.5 ** (min(hits, 8) - 1))
+                matched += 1
+        scores[doc_type] = (total, matched)
+    return scores
+
+
+def _evidence(score: float, matched: int) -> float:
+    """0..1: how much a type's own features back it, regardless of the other types."""
+    return min(matched / STRONG_FEATURES, 1.0) / 2 + min(score / STRONG_SCORE, 1.0) / 2
+
+
+def classify(text: str) -> tuple:
+    """(doc_type, confidence in 0..1). Confidence < CONFIDENT means "ask the LLM"."""
+    scores = score(text)
+    ranked = sorted(scores.items(), key=lambda kv: -kv[1][0])
+    (top_type, (top, matched)), (_, (second, second_matched)) = ranked[0], ranked[1]
+    if top < MIN_SCORE:
+        return "MIXED", top / MIN_SCORE * 0.5
+    if second >= MIN_SCORE and second >= top * MIXED_RATIO:
+        # Два сильных типа — это и есть MIXED; уверенность тем выше, чем оба сильнее
+        return "MIXED", _evidence(second, second_matched) * (0.5 + second / (2 * top))
+    # Отрыв от второго типа ничего не стоит без улик: одно слово «ЭЭГ» в направлении
+    # на ЭЭГ — не заключение ЭЭГ. Нужны несколько разных признаков и весомый счёт.
+    return top_type, _evidence(top, matched) * (0.5 + (top - second) / (2 * top))
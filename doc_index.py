@@ -0,0 +1,223 @@
+"""
+Yasno — local lexical index over uploaded documents.
+
+Documents are split into page-aware chunks and indexed with BM25 once per
+content hash. A chat turn then sends an outline plus the chunks relevant
+to the question instead of the whole document. No network, no models.
+
+split_document cuts text that is too big for one model call into
+token-bounded parts along page, document and date boundaries.
+"""
+
+import math
+import re
+from collections import Counter
+
+from content_cache import get_cache
+from message_budget import count_tokens
+
+CHUNK_CHARS = 1200
+TOP_K = 6
+OUTLINE_ENTRIES = 40
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+DATE_LINE_RE = re.compile(r"^\s*(?:\d{1,2}[./]\d{1,2}[./]\d{2,4}|(?:19|20)\d{2}-\d{2}-\d{2})")
+DOC_HEADER_RE = re.compile(r"^\[Документ: ")
+DATE_RE = re.compile(r"\b\d{1,2}[./]\d{1,2}[./]\d{2,4}\b|\b(?:19|20)\d{2}-\d{2}-\d{2}\b")
+
+# Грубый стемминг: отрезаем частые окончания, чтобы "депакина" и "депакин" совпадали
+RU_ENDINGS = sorted("""
+    иями ями ами ого его ому ему ыми ими ая яя ое ее ые ие ой ей ий ый ом ем ам ям ах ях
+    ую юю ов ев ия ию ие а я о е ы и у ю ь
+""".split(), key=len, reverse=True)
+EN_ENDINGS = ["ing", "es", "ed", "s"]
+
+_indexes = get_cache("doc-index")
+
+
+def stem(word: str) -> str:
+    if len(word) <= 4:
+        return word
+    endings = EN_ENDINGS if word.isascii() else RU_ENDINGS
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> list:
+    return [stem(t) for t in TOKEN_RE.findall(text.lower()) if len(t) > 1]
+
+
+def chunk_pages(pages: list, chunk_chars: int = CHUNK_CHARS) -> list:
+    """Split page texts into chunks on paragraph/line boundaries, never across pages."""
+    chunks = []
+    for p in pages:
+        text = p["text"].strip()
+        if not text:
+            continue
+        current = []
+        size = 0
+        for line in text.splitlines():
+            if size + len(line) > chunk_chars and current:
+                chunks.append({"page": p["page"], "text": "\n".join(current)})
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append({"page": p["page"], "text": "\n".join(current)})
+    return chunks
+
+
+def outline(pages: list, entries: int = OUTLINE_ENTRIES) -> str:
+    """First line of each page (sampled evenly) plus dates seen, as a map of the document."""
+    heads = []
+    for p in pages:
+        first = next((l.strip() for l in p["text"].splitlines() if l.strip()), "")
+        if first:
+            heads.append(f"стр. {p['page']}: {first[:80]}")
+    if len(heads) > entries:
+        step = len(heads) / entries
+        heads = [heads[int(i * step)] for i in range(entries)]
+
+    dates = []
+    for p in pages:
+        for d in DATE_RE.findall(p["text"]):
+            if d not in dates:
+                dates.append(d)
+
+    lines = [f"Страниц: {len(pages)}"]
+    if dates:
+        lines.append("Даты в документе: " + ", ".join(dates[:30]))
+    lines.extend(heads)
+    return "\n".join(lines)
+
+
+class DocIndex:
+    def __init__(self, pages: list):
+        self.page_count = len(pages)
+        self.outline = outline(pages)
+        self.chunks = chunk_pages(pages)
+        self.tf = [Counter(tokenize(c["text"])) for c in self.chunks]
+        self.lengths = [sum(tf.values()) for tf in self.tf]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        df = Counter()
+        for tf in self.tf:
+            df.update(tf.keys())
+        n = len(self.chunks)
+        self.idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def score(self, query_terms: list, i: int) -> float:
+        tf = self.tf[i]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / (self.avg_length or 1))
+        total = 0.0
+        for term in query_terms:
+            freq = tf.get(term)
+            if freq:
+                total += self.idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+        return total
+
+    def search(self, query: str, k: int = TOP_K) -> list:
+        """[(score, chunk), ...] best first; empty if nothing matches."""
+        terms = set(tokenize(query))
+        scored = [(self.score(terms, i), i) for i in range(len(self.chunks))]
+        scored = [s for s in scored if s[0] > 0]
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [(score, self.chunks[i]) for score, i in scored[:k]]
+
+
+def get_index(doc_hash: str, pages: list) -> DocIndex:
+    index = _indexes.get(doc_hash)
+    if index is None:
+        index = DocIndex(pages)
+        _indexes.put(doc_hash, index)
+    return index
+
+
+def select_chunks(indexes: dict, query: str, k: int = TOP_K) -> dict:
+    """
+    Top-k chunks across several documents: {key: [chunk, ...]} in page order,
+    keyed like `indexes` (any hashable key, e.g. the attachment position).
+    A document with no matches gets its opening chunk so it is never invisible.
+    """
+    hits = []
+    for name, index in indexes.items():
+        hits.extend((score, name, chunk) for score, chunk in index.search(query, k))
+    hits.sort(key=lambda h: -h[0])
+
+    selected = {name: [] for name in indexes}
+    for _, name, chunk in hits[:k]:
+        selected[name].append(chunk)
+    for name, index in indexes.items():
+        if not selected[name] and index.chunks:
+            selected[name].append(index.chunks[0])
+        selected[name].sort(key=lambda c: index.chunks.index(c))
+    return selected
+
+
+def _blocks(text: str):
+    """Pages (separated by \f), split again where a new document starts."""
+    for page in text.split("\f"):
+        current = []
+        for line in page.splitlines(keepends=True):
+            if DOC_HEADER_RE.match(line) and current:
+                yield "".join(current)
+                current = []
+            current.append(line)
+        if current:
+            yield "".join(current)
+
+
+def _pack(pieces: list, max_tokens: int, joiner: str) -> list:
+    chunks = []
+    current = []
+    size = 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if current and size + tokens > max_tokens:
+            chunks.append(joiner.join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += tokens
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+def _split_block(block: str, max_tokens: int) -> list:
+    """A page that alone is too big: cut before dated entries, then between lines."""
+    segments = []
+    current = []
+    for line in block.splitlines(keepends=True):
+        if DATE_LINE_RE.match(line) and current:
+            segments.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        segments.append("".join(current))
+
+    pieces = []
+    for segment in segments:
+        if count_tokens(segment) <= max_tokens:
+            pieces.append(segment)
+            continue
+        for line in segment.splitlines(keepends=True):
+            while count_tokens(line) > max_tokens:
+                cut = max(1, len(line) * max_tokens // count_tokens(line))
+                pieces.append(line[:cut])
+                line = line[cut:]
+            pieces.append(line)
+    return _pack(pieces, max_tokens, "")
+
+
+def split_document(text: str, max_tokens: int) -> list:
+    """Parts of at most ~max_tokens, cut at page/document boundaries where possible."""
+    pieces = []
+    for block in _blocks(text):
+        if count_tokens(block) <= max_tokens:
+            pieces.append(block)
+        else:
+            pieces.extend(_split_block(block, max_tokens))
+    return _pack(pieces, max_tokens, "\f")
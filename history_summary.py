@@ -0,0 +1,87 @@
+"""
+Yasno — rolling summary of the older part of a conversation.
+
+Turns that no longer fit in the prompt are folded into a running summary
+instead of being forgotten. Summaries are memoized by a rolling hash of the
+turns they cover, so each round only summarizes the newly aged-out turns
+on top of the previous summary.
+"""
+
+from content_cache import content_hash
+from rate_limiter import get_limiter, estimate_tokens, PRIORITY_CHAT
+
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_MAX_TOKENS = 600
+STORE_LIMIT = 20  # сколько конспектов держим в session_state
+
+SUMMARY_PROMPT = """
+Ты ведёшь краткий конспект разговора родителя с ассистентом Yasno о медицинских документах ребёнка.
+
+Тебе дают прежний конспект (может быть пустым) и новые реплики.
+Обнови конспект: добавь из новых реплик всё, что может понадобиться дальше.
+
+Сохраняй обязательно:
+- препараты, дозировки, даты
+- находки из документов и результаты обследований
+- выводы и договорённости
+- вопросы родителя, на которые ещё нет ответа
+
+Пиши кратко, списком, не больше 250 слов. Ничего не выдумывай.
+"""
+
+
+def rolling_keys(turns: list) -> list:
+    """keys[k] identifies turns[:k+1]; a prefix keeps its key as the history grows."""
+    keys = []
+    key = ""
+    for msg in turns:
+        key = content_hash(key + "\x00" + msg["role"] + "\x00" + msg["content"])
+        keys.append(key)
+    return keys
+
+
+def format_turns(turns: list) -> str:
+    names = {"user": "Родитель", "assistant": "Yasno"}
+    return "\n\n".join(names.get(m["role"], m["role"]) + ": " + m["content"] for m in turns)
+
+
+def summarize_turns(client, turns: list, store: dict):
+    """
+    Summary of all `turns`, reusing the longest already-summarized prefix from
+    `store` (key -> summary, e.g. a dict in st.session_state). Returns None if
+    the model call fails and there is nothing cached to fall back on.
+    """
+    if not turns:
+        return None
+    keys = rolling_keys(turns)
+    if keys[-1] in store:
+        return store[keys[-1]]
+
+    covered = 0
+    previous = ""
+    for k in range(len(keys) - 1, -1, -1):
+        if keys[k] in store:
+            covered = k + 1
+            previous = store[keys[k]]
+            break
+
+    messages = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": "ПРЕЖНИЙ КОНСПЕКТ:\n" + (previous or "—") + "\n\nНОВЫЕ РЕПЛИКИ:\n" + format_turns(turns[covered:])}
+    ]
+    try:
+        get_limiter(client.api_key).acquire(estimate_tokens(messages, SUMMARY_MAX_TOKENS), PRIORITY_CHAT)
+        response = client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=messages,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            temperature=0
+        )
+        summary = (response.choices[0].message.content or "").strip()
+    except Exception:
+        return previous or None
+
+    store[keys[-1]] = summary
+    while len(store) > STORE_LIMIT:
+        del store[next(iter(store))]
+    return summary
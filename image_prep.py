@@ -0,0 +1,81 @@
+"""
+Yasno — image preprocessing before base64.
+
+Phone photos are 4–12 MB, while the vision model downsamples anything
+larger than its tile grid (detail=high: fits 2048x2048, then the short side
+to 768; detail=low: 512x512). We fix EXIF orientation, downscale to that
+size and re-encode once; results are cached by content hash.
+"""
+
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from content_cache import get_cache, content_hash
+
+PROFILES = {
+    "Обычный разговор": {"detail": "high", "short_side": 768, "long_side": 2048, "format": "WEBP", "quality": 80},
+    "Глубокий анализ": {"detail": "high", "short_side": 768, "long_side": 2048, "format": "JPEG", "quality": 90},
+}
+DEFAULT_PROFILE = "Обычный разговор"
+
+MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+EXIF_ORIENTATION = 0x0112
+
+_cache = get_cache("image-prep")
+
+
+def target_size(width: int, height: int, short_side: int, long_side: int) -> tuple:
+    scale = min(1.0, long_side / max(width, height), short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode(file_bytes: bytes, profile: dict) -> tuple:
+    img = Image.open(BytesIO(file_bytes))
+    original_format = img.format
+    # exif_transpose всегда возвращает копию, поэтому «не трогали» решаем по тегу
+    upright = img.getexif().get(EXIF_ORIENTATION, 1) == 1
+    rotated = ImageOps.exif_transpose(img)
+    size = target_size(rotated.width, rotated.height, profile["short_side"], profile["long_side"])
+    untouched = upright and size == img.size
+
+    if size != rotated.size:
+        rotated = rotated.resize(size, Image.LANCZOS)
+    if rotated.mode not in ("RGB", "L"):
+        rotated = rotated.convert("RGB")
+
+    out = BytesIO()
+    rotated.save(out, profile["format"], quality=profile["quality"], optimize=True)
+    data = out.getvalue()
+
+    # Уже маленькая и правильно повёрнутая картинка — не пережимаем
+    if untouched and len(data) >= len(file_bytes) and original_format in MIME:
+        return file_bytes, MIME[original_format]
+    return data, MIME[profile["format"]]
+
+
+def prepare_image(file_bytes: bytes, mode: str = DEFAULT_PROFILE) -> dict:
+    """
+    Returns {"data": bytes, "mime": str, "detail": str,
+             "original_bytes": int, "sent_bytes": int}
+    Falls back to the original bytes (mime=None) if Pillow cannot decode the file.
+    """
+    profile = PROFILES.get(mode, PROFILES[DEFAULT_PROFILE])
+    key = "{}-{format}-{quality}-{short_side}x{long_side}".format(content_hash(file_bytes), **profile)
+
+    encoded = _cache.get(key)
+    if encoded is None:
+        try:
+            encoded = _encode(file_bytes, profile)
+            _cache.put(key, encoded)
+        except Exception:
+            encoded = (file_bytes, None)
+
+    data, mime = encoded
+    return {
+        "data": data,
+        "mime": mime,
+        "detail": profile["detail"],
+        "original_bytes": len(file_bytes),
+        "sent_bytes": len(data),
+    }
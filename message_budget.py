@@ -0,0 +1,181 @@
+"""
+Yasno — token-budgeted message assembly.
+
+Counts tokens locally and fills the model's input budget by priority:
+
+  1. system prompt and the current question — always sent
+  2. the last exchange (previous question + answer)
+  3. summary of older turns, if any (see history_summary)
+  4. attachments in upload order — room for images and scan pages is
+     reserved first, documents are truncated to what is left
+  5. older history, newest first, up to HISTORY_TOKENS
+
+Whatever does not fit is cut deterministically and listed in the report,
+so the request fits on the first try.
+"""
+
+import math
+from io import BytesIO
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # нет tiktoken или нет сети для словаря — считаем приблизительно
+    _encoding = None
+
+CONTEXT_TOKENS = 128000
+REPLY_TOKENS = 2000
+# Без tiktoken счёт приблизительный — запас шире, чтобы запрос всё равно влез
+SAFETY_TOKENS = 2000 if _encoding is not None else 16000
+INPUT_TOKEN_BUDGET = CONTEXT_TOKENS - REPLY_TOKENS - SAFETY_TOKENS
+HISTORY_TOKENS = 12000
+MESSAGE_OVERHEAD = 4
+TRUNCATION_MARK = "\n\n[… обрезано по лимиту контекста …]"
+SUMMARY_HEADER = "Краткое содержание более ранней части разговора:\n"
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # ~4 символа латиницы или ~3 кириллицы на токен
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 3)
+
+
+def image_tokens(data: bytes, detail: str) -> int:
+    """OpenAI vision pricing: 85 base + 170 per 512px tile after scaling (high detail)."""
+    if detail == "low":
+        return 85
+    try:
+        from PIL import Image
+        width, height = Image.open(BytesIO(data)).size
+    except Exception:
+        return 85 + 170 * 4
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def part_tokens(part: dict) -> int:
+    if part["type"] == "text":
+        return count_tokens(part["text"])
+    return part.get("tokens", 85)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix (cut at a line break when possible) that fits in max_tokens."""
+    budget = max_tokens - count_tokens(TRUNCATION_MARK)
+    if budget <= 0:
+        return ""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    cut = int(len(text) * budget / total)
+    while cut > 0 and count_tokens(text[:cut]) > budget:
+        cut = int(cut * 0.9)
+    newline = text.rfind("\n", 0, cut)
+    if newline > cut * 0.8:
+        cut = newline
+    return text[:cut] + TRUNCATION_MARK
+
+
+def attachment(kind: str, label: str, parts: list) -> dict:
+    """kind: "document" (truncatable text) or anything else (kept or dropped whole)."""
+    return {"kind": kind, "label": label, "parts": parts}
+
+
+def assemble(system: str, history: list, attachments: list, user_text: str, summary: str = None,
+             budget: int = INPUT_TOKEN_BUDGET, history_budget: int = HISTORY_TOKENS) -> tuple:
+    """
+    Returns (messages, report). Image parts must carry a precomputed "tokens"
+    key (see image_tokens); it is stripped before sending.
+
+    report["history_dropped"] is the number of leading history messages that
+    were left out — the prefix a summary should cover.
+    """
+    report = {"budget": budget, "used": 0, "dropped": [], "history_dropped": 0}
+    used = count_tokens(system) + count_tokens(user_text) + 2 * MESSAGE_OVERHEAD
+
+    # Последний обмен репликами — его обрезаем, но не выбрасываем
+    recent = history[-2:]
+    older = history[:-2]
+    kept_recent = []
+    for msg in recent:
+        tokens = count_tokens(msg["content"]) + MESSAGE_OVERHEAD
+        remaining = min(budget - used, history_budget) - MESSAGE_OVERHEAD
+        content = msg["content"]
+        if tokens - MESSAGE_OVERHEAD > remaining:
+            content = truncate_to_tokens(content, remaining)
+            report["dropped"].append({"kind": "history", "label": "предыдущая реплика", "truncated": True})
+            if not content:
+                continue
+            tokens = count_tokens(content) + MESSAGE_OVERHEAD
+        kept_recent.append({"role": msg["role"], "content": content})
+        used += tokens
+    history_used = sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in kept_recent)
+
+    summary_messages = []
+    if summary and older:
+        text = truncate_to_tokens(SUMMARY_HEADER + summary, min(budget - used, history_budget - history_used) - MESSAGE_OVERHEAD)
+        if text:
+            summary_messages.append({"role": "system", "content": text})
+            tokens = count_tokens(text) + MESSAGE_OVERHEAD
+            used += tokens
+            history_used += tokens
+
+    # Картинки и сканы не обрезаются — их место резервируем заранее, иначе
+    # первый большой документ заберёт весь остаток и они выпадут целиком
+    sizes = [sum(part_tokens(p) for p in item["parts"]) for item in attachments]
+    truncatable = [item["kind"] == "document" and len(item["parts"]) == 1 for item in attachments]
+    reserved = [0] * len(attachments)
+    free = budget - used
+    for i, tokens in enumerate(sizes):
+        if not truncatable[i] and tokens <= free:
+            reserved[i] = tokens
+            free -= tokens
+    reserved_after = [sum(reserved[i + 1:]) for i in range(len(attachments))]
+
+    content = []
+    for i, item in enumerate(attachments):
+        tokens = sizes[i]
+        available = budget - used - reserved_after[i]
+        if tokens <= available:
+            content.extend({k: v for k, v in p.items() if k != "tokens"} for p in item["parts"])
+            used += tokens
+            continue
+        if truncatable[i]:
+            text = truncate_to_tokens(item["parts"][0]["text"], available)
+            if text:
+                content.append({"type": "text", "text": text})
+                used += count_tokens(text)
+                report["dropped"].append({"kind": "document", "label": item["label"], "truncated": True})
+                continue
+        report["dropped"].append({"kind": item["kind"], "label": item["label"], "truncated": False})
+
+    # Более старая история — от новых к старым, пока помещается целиком
+    kept_older = []
+    for i in range(len(older) - 1, -1, -1):
+        tokens = count_tokens(older[i]["content"]) + MESSAGE_OVERHEAD
+        if used + tokens > budget or history_used + tokens > history_budget:
+            report["history_dropped"] = i + 1
+            label = f"{i + 1} старых сообщений" + (" (в кратком содержании)" if summary_messages else "")
+            report["dropped"].append({"kind": "history", "label": label, "truncated": False})
+            break
+        kept_older.append({"role": older[i]["role"], "content": older[i]["content"]})
+        used += tokens
+        history_used += tokens
+    kept_older.reverse()
+
+    messages = [{"role": "system", "content": system}] + summary_messages + kept_older + kept_recent
+    if content:
+        content.append({"type": "text", "text": user_text})
+        messages.append({"role": "user", "content": content})
+    else:
+        messages.append({"role": "user", "content": user_text})
+
+    report["used"] = used
+    return messages, report
@@ -0,0 +1,150 @@
+"""
+Yasno — PDF text extraction.
+
+Small documents are read page by page in-process. Large ones are split into
+page ranges and parsed in a process pool; ranges are yielded back in page
+order, so callers can start on the first pages while the rest are parsed.
+
+Pages without a text layer (scans) can be rendered to JPEG instead, so mixed
+scanned/typed records still reach the model.
+"""
+
+import math
+import os
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+from process_pool import get_pool, drop_pool
+
+PARALLEL_MIN_PAGES = 64   # меньше — дешевле читать в одном процессе
+MIN_PAGES_PER_TASK = 16
+MAX_WORKERS = int(os.environ.get("YASNO_PDF_WORKERS", 0)) or os.cpu_count() or 1
+
+MIN_PAGE_CHARS = 40                 # меньше символов — считаем страницу сканом
+SCAN_DPI = 150
+SCAN_MAX_SIDE = 2048                # пикселей по длинной стороне
+SCAN_JPEG_QUALITY = 80
+MAX_IMAGE_BYTES = 6 * 1024 * 1024   # на все сканы одного документа
+
+def _extract_range(path: str, start: int, stop: int) -> list:
+    doc = fitz.open(path, filetype="pdf")
+    try:
+        return [doc[i].get_text() for i in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def page_ranges(page_count: int, workers: int) -> list:
+    """Split pages into ~4 ranges per worker, so the first pages come back early."""
+    step = max(MIN_PAGES_PER_TASK, math.ceil(page_count / (workers * 4)))
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+def iter_pdf_pages(file_bytes: bytes, workers: int = None):
+    """Yield the text of each page in order."""
+    workers = workers or MAX_WORKERS
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    try:
+        page_count = doc.page_count
+        if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+            for page in doc:
+                yield page.get_text()
+            return
+    finally:
+        doc.close()
+
+    pool = get_pool(workers)
+    # Байты пишем во временный файл один раз — задачам уходит только путь и диапазон
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(file_bytes)
+    futures = []
+    done = 0
+    try:
+        try:
+            for start, stop in page_ranges(page_count, workers):
+                futures.append(pool.submit(_extract_range, path, start, stop))
+            for future in futures:
+                for text in future.result():
+                    done += 1
+                    yield text
+        except BrokenProcessPool:
+            # Процесс-обработчик упал (битый PDF) — пул больше не годится;
+            # дочитываем в этом процессе, следующий вызов создаст новый пул
+            drop_pool(workers, pool)
+            yield from _extract_range(path, done, page_count)
+    finally:
+        for future in futures:
+            future.cancel()
+        for future in futures:
+            if not future.cancelled():
+                try:
+                    future.exception()  # дождаться запущенных, прежде чем удалять файл
+                except Exception:
+                    pass
+        os.remove(path)
+
+
+def render_page_jpeg(page, dpi: int = SCAN_DPI, max_side: int = SCAN_MAX_SIDE) -> bytes:
+    longest = max(page.rect.width, page.rect.height) or 1
+    dpi = min(dpi, int(max_side * 72 / longest))
+    pix = page.get_pixmap(dpi=dpi)
+    return pix.tobytes("jpeg", jpg_quality=SCAN_JPEG_QUALITY)
+
+
+def extract_pdf_pages(file_bytes: bytes, workers: int = None, dpi: int = SCAN_DPI,
+                      max_image_bytes: int = MAX_IMAGE_BYTES) -> list:
+    """
+    Per-page extraction:
+    [{"page": 1, "text": "...", "scan": False, "image": None | jpeg bytes}, ...]
+
+    Pages with a usable text layer keep only text. Pages without one but
+    with embedded images are scans: they are rendered as JPEG until
+    max_image_bytes is spent, the rest keep image=None.
+    """
+    pages = [{"page": i + 1, "text": text, "scan": False, "image": None}
+             for i, text in enumerate(iter_pdf_pages(file_bytes, workers))]
+    candidates = [p for p in pages if len(p["text"].strip()) < MIN_PAGE_CHARS]
+    if not candidates:
+        return pages
+
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    try:
+        spent = 0
+        for p in candidates:
+            page = doc[p["page"] - 1]
+            if not page.get_images():
+                continue  # пустая страница, не скан
+            p["scan"] = True
+            if spent >= max_image_bytes:
+                continue
+            jpeg = render_page_jpeg(page, dpi)
+            if spent + len(jpeg) > max_image_bytes:
+                spent = max_image_bytes
+                continue
+            p["image"] = jpeg
+            spent += len(jpeg)
+    finally:
+        doc.close()
+    return pages
+
+
+def pages_to_text(pages: list, separator: str = "", images_attached: bool = True) -> str:
+    """
+    Joined page texts; separator="\f" keeps page boundaries visible to chunkers.
+    images_attached=False for callers that do not pass page images on, so scans
+    are marked as missing rather than attached.
+    """
+    parts = []
+    for p in pages:
+        if p["scan"] and not images_attached:
+            parts.append(p["text"] + f"[Стр. {p['page']}: скан без текста, изображение не передаётся]\n")
+        elif p["image"] is not None:
+            parts.append(f"[Стр. {p['page']}: скан, приложен изображением]\n")
+        elif p["scan"]:
+            parts.append(p["text"] + f"[Стр. {p['page']}: скан без текста, не приложен — превышен лимит]\n")
+        else:
+            parts.append(p["text"])
+    return separator.join(parts).strip()
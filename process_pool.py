@@ -0,0 +1,44 @@
+"""
+Yasno — shared process pools for CPU-bound parsing (PDF pages, video segments).
+
+One pool per worker count for the whole process, started on first use.
+A worker that dies (a decoder crashing on a malformed file) breaks its pool
+for good: callers catch BrokenProcessPool, call drop_pool and finish the
+work in-process; the next call starts a fresh pool.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        if workers not in _pools:
+            # spawn: у вызывающего (Streamlit) есть потоки, fork из многопоточного процесса небезопасен
+            ctx = multiprocessing.get_context("spawn")
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        return _pools[workers]
+
+
+def drop_pool(workers: int, pool: ProcessPoolExecutor):
+    """Forget a broken pool, so the next get_pool starts a fresh one."""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def worker_counts() -> list:
+    """1, 2, 4, … up to the number of cores — process counts worth benchmarking."""
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
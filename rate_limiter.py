@@ -0,0 +1,216 @@
+"""
+Yasno — shared rate limiter for OpenAI calls.
+
+One limiter per API key for the whole process: a requests-per-minute and a
+tokens-per-minute bucket. Callers queue instead of hitting 429s, and are
+served by priority — interactive chat first, then the council, then batch
+video analysis — and first-come-first-served within a priority.
+
+Works from threads (acquire) and from the shared event loop (acquire_async).
+
+Limits are opt-in: without YASNO_OPENAI_RPM / YASNO_OPENAI_TPM nothing is
+throttled, since the real limits depend on the key's usage tier. The queue
+is per process: the analyze_video CLI and the Streamlit app each have their
+own, so "batch behind chat" only holds within one process.
+"""
+
+import asyncio
+import base64
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from message_budget import count_tokens, image_tokens
+
+PRIORITY_CHAT = 0
+PRIORITY_COUNCIL = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_COUNCIL: "council", PRIORITY_BATCH: "batch"}
+
+RPM = int(os.environ.get("YASNO_OPENAI_RPM", 0)) or None  # None — без ограничения
+TPM = int(os.environ.get("YASNO_OPENAI_TPM", 0)) or None
+ASYNC_POLL = 0.05  # сек — как часто async-ожидающий перепроверяет очередь
+
+def _image_part_tokens(part: dict) -> int:
+    """Inline (data URL) images are priced by their real size, like message_budget does."""
+    image = part.get("image_url", {})
+    detail = image.get("detail", "high")
+    url = image.get("url", "")
+    data = b""
+    if url.startswith("data:"):
+        try:
+            data = base64.b64decode(url.partition(",")[2])
+        except ValueError:
+            pass
+    return image_tokens(data, detail)
+
+
+def estimate_tokens(messages: list, max_tokens: int = 0) -> int:
+    """Prompt tokens (text counted locally, images by size and detail) plus the reply allowance."""
+    total = max_tokens
+    for msg in messages:
+        content = msg["content"]
+        if isinstance(content, str):
+            total += count_tokens(content) + 4
+            continue
+        for part in content:
+            if part["type"] == "text":
+                total += count_tokens(part["text"])
+            else:
+                total += _image_part_tokens(part)
+        total += 4
+    return total
+
+
+class RequestTooLarge(ValueError):
+    """The request alone needs more tokens than the per-minute limit allows."""
+
+
+class RateLimiter:
+    def __init__(self, rpm: int = RPM, tpm: int = TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._stats = {p: {"granted": 0, "waited": 0.0, "max_wait": 0.0} for p in PRIORITY_NAMES}
+
+    # ─── buckets ──────────────────────────────────────
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_needed(self, tokens) -> float:
+        """Seconds until both buckets can cover the request (0 if now)."""
+        self._refill()
+        wait = 0.0
+        if self.rpm:
+            wait = max(wait, max(0.0, 1 - self._requests) * 60 / self.rpm)
+        if self.tpm:
+            wait = max(wait, max(0.0, tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _try_take(self, ticket, tokens) -> float:
+        """Take from the buckets if `ticket` is first in line; else return seconds to wait."""
+        if self._queue[0] != ticket:
+            return ASYNC_POLL
+        wait = self._wait_needed(tokens)
+        if wait > 0:
+            return wait
+        heapq.heappop(self._queue)
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+        self._cond.notify_all()
+        return 0.0
+
+    def _record(self, priority, started):
+        waited = time.monotonic() - started
+        stats = self._stats[priority]
+        stats["granted"] += 1
+        stats["waited"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+        return waited
+
+    def _leave(self, ticket):
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def _admit(self, tokens, priority, started):
+        """Checks before queueing: over-limit requests fail, an unlimited limiter lets everyone through."""
+        if self.tpm and tokens > self.tpm:
+            raise RequestTooLarge(f"запрос на ~{tokens} токенов больше лимита {self.tpm} токенов в минуту")
+        if not self.rpm and not self.tpm:
+            with self._cond:
+                return self._record(priority, started)
+        return None
+
+    # ─── public ───────────────────────────────────────
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_CHAT) -> float:
+        """Block until the request may go out; returns seconds waited. RequestTooLarge if it never can."""
+        started = time.monotonic()
+        waited = self._admit(tokens, priority, started)
+        if waited is not None:
+            return waited
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    wait = self._try_take(ticket, tokens)
+                    if wait == 0:
+                        return self._record(priority, started)
+                    self._cond.wait(wait)
+            except BaseException:
+                self._leave(ticket)
+                raise
+
+    async def acquire_async(self, tokens: int, priority: int = PRIORITY_COUNCIL) -> float:
+        """acquire() for coroutines: waits with asyncio.sleep, never blocks the loop."""
+        started = time.monotonic()
+        waited = self._admit(tokens, priority, started)
+        if waited is not None:
+            return waited
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(ticket, tokens)
+                    if wait == 0:
+                        return self._record(priority, started)
+                await asyncio.sleep(min(wait, ASYNC_POLL))
+        except BaseException:
+            with self._cond:
+                self._leave(ticket)
+            raise
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill()
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                depth[PRIORITY_NAMES[priority]] += 1
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests_available": int(self._requests) if self.rpm else None,
+                "tokens_available": int(self._tokens) if self.tpm else None,
+                "queue_depth": depth,
+                "wait": {
+                    PRIORITY_NAMES[p]: {
+                        "granted": s["granted"],
+                        "avg_wait": s["waited"] / s["granted"] if s["granted"] else 0.0,
+                        "max_wait": s["max_wait"],
+                    }
+                    for p, s in self._stats.items()
+                },
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(api_key: str) -> RateLimiter:
+    """Process-wide limiter per API key — OpenAI limits are per key/organization."""
+    with _limiters_lock:
+        if api_key not in _limiters:
+            _limiters[api_key] = RateLimiter()
+        return _limiters[api_key]
@@ -0,0 +1,78 @@
+"""
+Yasno — throttled rendering of streamed chat responses.
+
+Re-rendering the whole markdown on every delta is O(n²) in reply length.
+StreamRenderer buffers deltas in a list and redraws at most every
+FLUSH_INTERVAL seconds or FLUSH_CHARS new characters, and records
+time-to-first-token and throughput.
+"""
+
+import time
+
+from message_budget import count_tokens
+
+FLUSH_INTERVAL = 0.05  # сек
+FLUSH_CHARS = 200
+CURSOR = "▌"
+
+
+class StreamRenderer:
+    def __init__(self, placeholder, flush_interval: float = FLUSH_INTERVAL, flush_chars: int = FLUSH_CHARS):
+        self.placeholder = placeholder
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self._parts = []
+        self._pending_chars = 0
+        self._last_flush = 0.0
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.deltas = 0
+        self.flushes = 0
+
+    def start(self):
+        """Reset the clock — call right before the request is sent."""
+        self.started = time.perf_counter()
+
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def write(self, delta: str):
+        if not delta:
+            return
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self._parts.append(delta)
+        self._pending_chars += len(delta)
+        self.deltas += 1
+        if self._pending_chars >= self.flush_chars or now - self._last_flush >= self.flush_interval:
+            self._flush(now, CURSOR)
+
+    def finish(self) -> str:
+        self.finished_at = time.perf_counter()
+        self._flush(self.finished_at, "")
+        return self.text()
+
+    def _flush(self, now, suffix):
+        # Склеиваем буфер в одну строку, чтобы следующий join был дешёвым
+        text = "".join(self._parts)
+        self._parts = [text]
+        self.placeholder.markdown(text + suffix)
+        self._pending_chars = 0
+        self._last_flush = now
+        self.flushes += 1
+
+    def stats(self) -> dict:
+        end = self.finished_at or time.perf_counter()
+        ttft = (self.first_token_at - self.started) if self.first_token_at else None
+        generation = (end - self.first_token_at) if self.first_token_at else 0
+        tokens = count_tokens(self.text())
+        return {
+            "ttft": ttft,
+            "tokens": tokens,
+            "deltas": self.deltas,
+            "tokens_per_sec": tokens / generation if generation > 0 else 0.0,
+            "flushes": self.flushes,
+            "total": end - self.started,
+        }
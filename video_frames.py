@@ -0,0 +1,458 @@
+"""
+Yasno — frame extraction from video files.
+
+Seeking with CAP_PROP_POS_FRAMES makes the decoder jump back to the
+keyframe before the target and decode forward to it, once per sample.
+When samples are close together that re-decodes the same GOP over and
+over; one forward pass is cheaper: grab() every frame (decode only, no
+color conversion or copy) and retrieve() just the targets.
+
+When the next target is far ahead, grabbing through the gap decodes every
+frame in it, while a seek only decodes from the nearest keyframe. The
+"auto" strategy therefore walks forward through short gaps and seeks over
+long ones.
+
+The adaptive sampler scans the video cheaply first and spends the frame
+budget where something happens, instead of at evenly spaced timestamps.
+Near-identical frames are then merged by perceptual hash and their slots
+refilled from the least sampled stretches of the video.
+
+Long videos are split into time segments, each decoded by its own
+VideoCapture in a process pool; results come back in timestamp order, with
+a cap on how many decoded frames are in flight at once.
+
+Frames are downscaled to the size the vision model keeps at the requested
+detail before JPEG encoding, one at a time as they are decoded.
+"""
+
+import math
+import os
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from image_prep import target_size
+from process_pool import get_pool, drop_pool
+
+STRATEGIES = ("auto", "sequential", "seek")
+DEFAULT_STRATEGY = "auto"
+SEEK_GAP_SECONDS = 2.0  # разрыв длиннее ~GOP телефонного видео — дешевле seek
+
+PARALLEL_MIN_SECONDS = 120  # короче — быстрее в одном процессе
+TASKS_PER_WORKER = 4
+MIN_SCAN_PER_TASK = 32      # кадров сканирования на задачу, иначе seek и запуск дороже работы
+MAX_WORKERS = int(os.environ.get("YASNO_VIDEO_WORKERS", 0)) or os.cpu_count() or 1
+MAX_INFLIGHT_BYTES = 256 * 1024 * 1024  # сырых кадров одновременно в пути из процессов
+
+def open_video(video_path: str) -> tuple:
+    """(cap, info) where info has total_frames, fps, duration, width and height. ValueError if unreadable."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Не могу открыть видео: {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    info = {
+        "total_frames": total_frames,
+        "fps": fps,
+        "duration": total_frames / fps if fps > 0 else 0,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    return cap, info
+
+
+def uniform_indices(total_frames: int, num_frames: int) -> list:
+    return [int(i * total_frames / num_frames) for i in range(num_frames)]
+
+
+def seek_gap_frames(fps: float, seconds: float = SEEK_GAP_SECONDS) -> int:
+    return max(1, int(round((fps if fps > 0 else 30) * seconds)))
+
+
+def read_frames(cap, indices: list, strategy: str = DEFAULT_STRATEGY, seek_gap: int = None):
+    """
+    Yield (frame_idx, frame) for the sorted, de-duplicated `indices`, in order.
+
+    - "seek": set CAP_PROP_POS_FRAMES before every target (the old behavior)
+    - "sequential": one forward pass, grab() through gaps, retrieve() targets
+    - "auto": sequential, but seek when the gap exceeds `seek_gap` frames
+      (default: SEEK_GAP_SECONDS at the video's fps)
+
+    A target that cannot be decoded (bad seek, corrupt frame, or past the
+    real end of a stream whose container promised more frames) is skipped;
+    the next target is then reached by a seek, since the decoder position is
+    no longer known.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия: {strategy}")
+    if seek_gap is None:
+        seek_gap = seek_gap_frames(cap.get(cv2.CAP_PROP_FPS))
+    if strategy == "sequential":
+        seek_gap = float("inf")
+    elif strategy == "seek":
+        seek_gap = 0
+
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))  # индекс следующего кадра, None — неизвестен
+    for idx in sorted(set(indices)):
+        if position is None or idx < position or idx - position > seek_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            position = idx
+        while position < idx and cap.grab():
+            position += 1
+        if position != idx:  # кадр в разрыве не декодировался — прыгаем к цели
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            position = idx
+        ok, frame = cap.read()
+        if not ok:
+            position = None
+            continue
+        position += 1
+        yield idx, frame
+
+
+def _parallel(info: dict, workers: int) -> bool:
+    return workers > 1 and info["duration"] >= PARALLEL_MIN_SECONDS
+
+
+def _split(indices: list, workers: int, min_size: int = 1, max_size: int = None) -> list:
+    """Contiguous runs of `indices`, ~TASKS_PER_WORKER per worker, so early segments come back early."""
+    size = max(min_size, math.ceil(len(indices) / (workers * TASKS_PER_WORKER)))
+    if max_size:
+        size = max(1, min(size, max_size))
+    return [indices[i:i + size] for i in range(0, len(indices), size)]
+
+
+def _read_segment_iter(video_path: str, indices: list, strategy: str):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        yield from read_frames(cap, indices, strategy)
+    finally:
+        cap.release()
+
+
+def _read_segment(video_path: str, indices: list, strategy: str) -> list:
+    return list(_read_segment_iter(video_path, indices, strategy))
+
+
+def iter_frames(video_path: str, info: dict, indices, strategy: str = DEFAULT_STRATEGY, workers: int = None,
+                max_inflight_bytes: int = MAX_INFLIGHT_BYTES):
+    """
+    Yield (frame_idx, frame) for `indices` in time order. Videos longer than
+    PARALLEL_MIN_SECONDS are read as segments in a process pool; at most
+    `max_inflight_bytes` of decoded frames are submitted but not yet consumed.
+    If the pool breaks, the remaining frames are read in-process.
+    """
+    indices = sorted(set(indices))
+    workers = workers or MAX_WORKERS
+    if not _parallel(info, workers) or len(indices) < 2:
+        yield from _read_segment_iter(video_path, indices, strategy)
+        return
+
+    frame_bytes = max(1, info["width"] * info["height"] * 3)
+    budget = max(1, max_inflight_bytes // frame_bytes)  # кадров в пути
+    tasks = _split(indices, workers, max_size=max(1, budget // workers))
+    pool = get_pool(workers)
+    pending = deque()
+    in_flight = 0
+    last = -1
+    try:
+        try:
+            for task in tasks:
+                while pending and in_flight + len(task) > budget:
+                    future, size = pending.popleft()
+                    for idx, frame in future.result():
+                        last = idx
+                        yield idx, frame
+                    in_flight -= size
+                pending.append((pool.submit(_read_segment, video_path, task, strategy), len(task)))
+                in_flight += len(task)
+            while pending:
+                future, _ = pending.popleft()
+                for idx, frame in future.result():
+                    last = idx
+                    yield idx, frame
+        except BrokenProcessPool:
+            # Процесс-декодер упал — пул больше не годится, дочитываем здесь
+            drop_pool(workers, pool)
+            yield from _read_segment_iter(video_path, [i for i in indices if i > last], strategy)
+    finally:
+        for future, _ in pending:
+            future.cancel()
+
+
+# ─── выбор кадров ─────────────────────────────────
+
+SAMPLERS = ("uniform", "adaptive")
+SCAN_FPS = 2.0         # сколько кадров в секунду смотрит адаптивный сэмплер
+SCAN_WIDTH = 96        # ширина уменьшенного серого кадра для сигналов
+HIST_BINS = 32
+UNIFORM_SHARE = 0.4    # доля бюджета, которая всё равно распределяется равномерно
+
+
+def _small_gray(frame):
+    h, w = frame.shape[:2]
+    size = (SCAN_WIDTH, max(1, h * SCAN_WIDTH // w))
+    return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+
+def _scan_signals(cap, indices, strategy: str) -> list:
+    """[(frame_idx, (diff, hist_dist, flow)), ...]; the first frame has no predecessor and scores zero."""
+    out = []
+    prev_gray = prev_hist = None
+    for idx, frame in read_frames(cap, indices, strategy):
+        gray = _small_gray(frame)
+        hist = np.bincount(gray.ravel() // (256 // HIST_BINS), minlength=HIST_BINS) / gray.size
+        if prev_gray is None:
+            out.append((idx, (0.0, 0.0, 0.0)))
+        else:
+            diff = np.abs(gray.astype(np.int16) - prev_gray).mean()
+            hist_dist = 0.5 * np.abs(hist - prev_hist).sum()
+            flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 2, 9, 2, 5, 1.1, 0)
+            out.append((idx, (diff, hist_dist, np.sqrt((flow ** 2).sum(axis=2)).mean())))
+        prev_gray, prev_hist = gray, hist
+    return out
+
+
+def _scan_segment(video_path: str, indices: list, strategy: str, predecessor: int = None) -> list:
+    """_scan_signals over one segment, starting from the last frame of the previous one."""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        out = _scan_signals(cap, ([predecessor] if predecessor is not None else []) + indices, strategy)
+    finally:
+        cap.release()
+    if predecessor is not None and out and out[0][0] == predecessor:
+        out = out[1:]
+    return out
+
+
+def activity_profile(video_path: str, info: dict, scan_fps: float = SCAN_FPS, strategy: str = DEFAULT_STRATEGY,
+                     workers: int = None) -> tuple:
+    """
+    Scan the video at `scan_fps` and score how much changes at each scanned
+    frame, from three signals on a small grayscale copy:
+
+    - frame-difference energy: mean absolute pixel change
+    - histogram distance: L1 between brightness histograms (scene changes)
+    - optical-flow magnitude: mean Farneback flow (movement, even when
+      colors barely change)
+
+    Each signal is measured above its median (compression noise, steady
+    camera shake) and scaled by its 99th percentile, clipped, so one cut or
+    camera bump does not drown everything else. Returns (frame_indices,
+    activity) as NumPy arrays, activity in [0, 1].
+
+    Long videos are scanned as segments in parallel; each segment also
+    decodes the last frame of the one before, so the signals do not depend
+    on where the video was cut.
+    """
+    fps = info["fps"] if info["fps"] > 0 else 30
+    step = max(1, int(round(fps / scan_fps)))
+    scan = list(range(0, info["total_frames"], step))
+    workers = workers or MAX_WORKERS
+
+    if _parallel(info, workers):
+        segments = _split(scan, workers, min_size=MIN_SCAN_PER_TASK)
+        pool = get_pool(workers)
+        futures = []
+        try:
+            for i, seg in enumerate(segments):
+                futures.append(pool.submit(_scan_segment, video_path, seg, strategy,
+                                           segments[i - 1][-1] if i else None))
+            scanned = [item for future in futures for item in future.result()]
+        except BrokenProcessPool:
+            drop_pool(workers, pool)
+            scanned = _scan_segment(video_path, scan, strategy)
+        finally:
+            for future in futures:
+                future.cancel()
+    else:
+        scanned = _scan_segment(video_path, scan, strategy)
+
+    indices = np.array([idx for idx, _ in scanned], dtype=np.int64)
+    signals = np.array([sig for _, sig in scanned], dtype=np.float64).reshape(-1, 3)
+    if not len(signals):
+        return indices, np.zeros(0)
+    baseline = np.median(signals, axis=0)
+    scale = np.percentile(signals, 99, axis=0) - baseline
+    scale[scale <= 0] = 1.0
+    activity = np.clip((signals - baseline) / scale, 0.0, 1.0).mean(axis=1)
+    return indices, activity
+
+
+def adaptive_indices(indices, activity, num_frames: int, uniform_share: float = UNIFORM_SHARE) -> list:
+    """
+    Spend `num_frames` on the scanned frames: `uniform_share` of the budget
+    keeps the whole video covered, the rest follows activity. Frames are
+    placed at even quantiles of the mixed weight, so a busy stretch gets
+    several frames and a still one keeps at least its uniform share.
+    """
+    n = len(indices)
+    if n <= num_frames:
+        return [int(i) for i in indices]
+    total = activity.sum()
+    weights = np.full(n, 1.0 / n)
+    if total > 0:
+        weights = uniform_share * weights + (1 - uniform_share) * activity / total
+    cdf = np.cumsum(weights)
+    targets = (np.arange(num_frames) + 0.5) / num_frames * cdf[-1]
+    picks = np.minimum(np.searchsorted(cdf, targets), n - 1)
+
+    # Несколько квантилей в одном кадре — раздвигаем на ближайшие свободные
+    chosen = set()
+    for p in picks:
+        for offset in range(n):
+            free = [q for q in (p + offset, p - offset) if 0 <= q < n and q not in chosen]
+            if free:
+                chosen.add(free[0])
+                break
+    return sorted(int(indices[q]) for q in chosen)
+
+
+def sample_indices(video_path: str, info: dict, num_frames: int, sampler: str = "uniform",
+                   strategy: str = DEFAULT_STRATEGY, workers: int = None) -> dict:
+    """{frame_idx: activity or None} of the frames to extract, chosen by `sampler`."""
+    if sampler == "uniform":
+        return {idx: None for idx in uniform_indices(info["total_frames"], num_frames)}
+    if sampler != "adaptive":
+        raise ValueError(f"Неизвестный сэмплер: {sampler}")
+    indices, activity = activity_profile(video_path, info, strategy=strategy, workers=workers)
+    by_index = dict(zip(indices.tolist(), activity.tolist()))
+    return {idx: by_index[idx] for idx in adaptive_indices(indices, activity, num_frames)}
+
+
+# ─── дедупликация ─────────────────────────────────
+
+HASH_METHODS = ("phash", "dhash")
+DEDUP_THRESHOLD = 6    # бит из 64: ближе — кадры считаем одинаковыми
+BACKFILL_ROUNDS = 3
+
+
+def dhash(frame) -> int:
+    """64-bit difference hash: is each pixel of a 9x8 gray thumbnail brighter than its left neighbour."""
+    gray = cv2.cvtColor(cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    bits = gray[:, 1:] > gray[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def phash(frame) -> int:
+    """64-bit perceptual hash: low 8x8 DCT frequencies of a 32x32 gray thumbnail against their median."""
+    gray = cv2.cvtColor(cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    low = cv2.dct(gray.astype(np.float32))[:8, :8].ravel()
+    bits = low > np.median(low[1:])  # постоянную составляющую в медиану не берём
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+HASHES = {"phash": phash, "dhash": dhash}
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _gap_midpoints(tried: list, total_frames: int, count: int) -> list:
+    """Midpoints of the `count` largest gaps between tried frame indices, splitting as it goes."""
+    bounds = sorted(set(tried) | {-1, total_frames})
+    picks = []
+    for _ in range(count):
+        width, start = max((b - a, a) for a, b in zip(bounds, bounds[1:]))
+        if width < 2:
+            break
+        mid = start + width // 2
+        picks.append(mid)
+        bounds = sorted(bounds + [mid])
+    return picks
+
+
+def dedup_frames(video_path: str, info: dict, frames: list, threshold: int = DEDUP_THRESHOLD, method: str = "phash",
+                 strategy: str = DEFAULT_STRATEGY, rounds: int = BACKFILL_ROUNDS, workers: int = None,
+                 encode=None) -> tuple:
+    """
+    Drop near-identical frames and backfill the freed slots.
+
+    `frames` is an iterable of (frame_idx, frame). A frame within
+    `threshold` bits (Hamming distance of `method` hashes) of an already kept
+    frame is merged into it. Freed slots are refilled from the middle of the
+    widest time gaps between frames seen so far — the least sampled
+    stretches — for up to `rounds` rounds, since a backfilled frame can be a
+    duplicate too.
+
+    Kept frames go through `encode` as they arrive (e.g. FrameEncoder.encode),
+    so with a streaming `frames` no full-resolution frame outlives its hash.
+
+    Returns (kept, merged): kept is [(frame_idx, encode(frame)), ...] in time
+    order, merged maps a kept frame_idx to the frame indices folded into it.
+    """
+    frame_hash = HASHES[method]
+    encode = encode or (lambda frame: frame)
+    kept = []
+    hashes = []
+    merged = {}
+    tried = []
+
+    def add(batch):
+        for idx, frame in batch:
+            tried.append(idx)
+            h = frame_hash(frame)
+            distances = [hamming(h, other) for other in hashes]
+            if distances and min(distances) <= threshold:
+                twin = kept[distances.index(min(distances))][0]
+                merged.setdefault(twin, []).append(idx)
+                continue
+            kept.append((idx, encode(frame)))
+            hashes.append(h)
+
+    add(frames)
+    target = len(tried)
+    for _ in range(rounds):
+        missing = target - len(kept)
+        if missing <= 0:
+            break
+        before = len(tried)
+        add(iter_frames(video_path, info, _gap_midpoints(tried, info["total_frames"], missing), strategy, workers))
+        if len(tried) == before:
+            break
+
+    kept.sort(key=lambda item: item[0])
+    return kept, {idx: sorted(dups) for idx, dups in merged.items()}
+
+
+# ─── кодирование ──────────────────────────────────
+
+# До какого размера модель всё равно ужмёт кадр: (короткая, длинная сторона)
+FRAME_SIZES = {"low": (512, 512), "high": (768, 2048)}
+JPEG_QUALITY = 85
+
+
+class FrameEncoder:
+    """
+    Downscale frames to what the vision model keeps at `detail`, then
+    JPEG-encode. Frames of one video share a size, so the resize writes into
+    one reused buffer; only the small JPEGs are allocated per frame.
+    """
+
+    def __init__(self, detail: str = "low", quality: int = JPEG_QUALITY):
+        self.detail = detail
+        self.short_side, self.long_side = FRAME_SIZES[detail]
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self._buffer = None
+
+    def resize(self, frame):
+        """`frame` downscaled into the shared buffer (valid until the next call), or `frame` itself."""
+        h, w = frame.shape[:2]
+        size = target_size(w, h, self.short_side, self.long_side)
+        if size == (w, h):
+            return frame
+        shape = (size[1], size[0]) + frame.shape[2:]
+        if self._buffer is None or self._buffer.shape != shape or self._buffer.dtype != frame.dtype:
+            self._buffer = np.empty(shape, dtype=frame.dtype)
+        cv2.resize(frame, size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+        return self._buffer
+
+    def encode(self, frame):
+        """JPEG as a 1-D uint8 array (bytes-like, ready for base64)."""
+        ok, jpeg = cv2.imencode(".jpg", self.resize(frame), self.params)
+        if not ok:
+            raise ValueError("Не удалось закодировать кадр")
+        return jpeg